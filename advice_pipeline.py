@@ -0,0 +1,137 @@
+"""
+Item-level pipelining from advice generation into advised answering.
+
+The two-phase flow runs gen_advice to completion and then starts gen_answers_with_advice on a second
+server. Here every advice record is handed to the advised-answer stage as soon as it is generated, so the
+advice server and the student servers work at the same time. Several student models can consume the same
+advice stream; each gets its own queue and writes its own output file.
+
+    python advice_pipeline.py --input_file dataset/puzzles.jsonl --advice_file advice.jsonl \
+        --advice_api_base http://localhost:8010/v1 --advice_model_name qwen3-32b-chat \
+        --student_api_bases http://localhost:8011/v1,http://localhost:8012/v1 \
+        --student_model_names qwen2.5-7b,qwen2.5-14b-chat \
+        --output_files result_with_advice/7b.jsonl,result_with_advice/14b.jsonl
+
+Records are matched by dataset idx and all output files are written in completion order; merge_shards.py
+with the input as reference restores input order if needed.
+"""
+import queue
+import argparse
+import threading
+
+from utils import add_shard_args, add_window_args
+from generate_puzzle_advice import gen_advice
+from generate_puzzle_answers_with_advice import gen_answers_with_advice
+from result_store import ResultStore
+
+_END = object()
+
+
+class AdviceStream:
+    """
+    Iterable fed from another thread: put() advice records, close() when done. With `maxsize` set, put()
+    blocks while that many records are waiting, which throttles the advice stage to the student's pace.
+    """
+
+    def __init__(self, maxsize=0):
+        self.queue = queue.Queue(maxsize)
+
+    def put(self, record):
+        self.queue.put(record)
+
+    def close(self):
+        self.queue.put(_END)
+
+    def __iter__(self):
+        while True:
+            record = self.queue.get()
+            if record is _END:
+                return
+            yield record
+
+
+def pipeline_advice_answers(input_file, advice_file, advice_api_base, advice_model_name, students,
+                            advice_max_tokens=512, max_tokens=1024, temperature=0.7, threads=10,
+                            shard_index=0, num_shards=1, shard_balance="hash", window=None,
+                            store_dir=None, store_run=""):
+    """
+    Generates advice for `input_file` (written to `advice_file`) and answers every puzzle with each student
+    while the advice is still being generated.
+    `students` is a list of (api_base, model_name, output_file); every student gets its own `threads` workers.
+    With `window` set, each student queue holds at most `window` advice records and each stage keeps at most
+    `window` requests in flight.
+    With `store_dir` set, the dataset is registered once and all students append to one shared store.
+    """
+    store = None
+    if store_dir:
+        store = ResultStore(store_dir)
+        store.add_dataset_file(input_file)
+    streams = [AdviceStream(window or 0) for _ in students]
+    errors = []
+
+    def run_student(stream, api_base, model_name, output_file):
+        try:
+            gen_answers_with_advice(input_file, stream, output_file, api_base, model_name, max_tokens=max_tokens,
+                                    temperature=temperature, threads=threads, window=window,
+                                    store_dir=store, store_run=store_run)
+        except BaseException as e:
+            errors.append((model_name, e))
+            # Keep draining so the advice stage is never blocked by a failed student.
+            for _ in stream:
+                pass
+
+    workers = [threading.Thread(target=run_student, args=(stream,) + tuple(student), daemon=True)
+               for stream, student in zip(streams, students)]
+    for worker in workers:
+        worker.start()
+    try:
+        gen_advice(input_file, advice_file, advice_api_base, advice_model_name, max_tokens=advice_max_tokens,
+                   temperature=temperature, threads=threads, shard_index=shard_index, num_shards=num_shards,
+                   shard_balance=shard_balance, window=window, advice_sinks=[stream.put for stream in streams])
+    finally:
+        for stream in streams:
+            stream.close()
+        for worker in workers:
+            worker.join()
+    if errors:
+        for model_name, e in errors:
+            print(f"[ERROR] Advised answering with {model_name} failed: {e!r}")
+        raise RuntimeError(f"[ERROR] {len(errors)} of {len(students)} students failed.") from errors[0][1]
+    print(f"[INFO] Pipelined advice and answers for {len(students)} student(s) complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream advice into advised answering for one or more students.")
+    parser.add_argument("--input_file", type=str, required=True, help="Path to the input JSONL file.")
+    parser.add_argument("--advice_file", type=str, required=True, help="Where to write the generated advice.")
+    parser.add_argument("--advice_api_base", type=str, required=True, help="API base of the advice model server.")
+    parser.add_argument("--advice_model_name", type=str, required=True, help="Name of the advice model.")
+    parser.add_argument("--student_api_bases", type=str, required=True,
+                        help="Comma-separated API bases of the student servers (one, or one per student).")
+    parser.add_argument("--student_model_names", type=str, required=True, help="Comma-separated student model names.")
+    parser.add_argument("--output_files", type=str, required=True, help="Comma-separated output files, one per student.")
+    parser.add_argument("--advice_max_tokens", type=int, default=512, help="Maximum number of advice tokens.")
+    parser.add_argument("--max_tokens", type=int, default=1024, help="Maximum number of answer tokens.")
+    parser.add_argument("--temperature", type=float, default=0.7, help="Temperature for generation.")
+    parser.add_argument("--threads", type=int, default=10, help="Worker threads per stage.")
+    add_shard_args(parser)
+    add_window_args(parser)
+    parser.add_argument("--store_dir", type=str, default=None,
+                        help="Also write each student's answers into this result store (see result_store.py).")
+    parser.add_argument("--store_run", type=str, default="", help="Run label for store records.")
+
+    args = parser.parse_args()
+
+    model_names = args.student_model_names.split(',')
+    api_bases = args.student_api_bases.split(',')
+    if len(api_bases) == 1:
+        api_bases = api_bases * len(model_names)
+    output_files = args.output_files.split(',')
+    if not len(api_bases) == len(model_names) == len(output_files):
+        raise ValueError("[ERROR] Need one API base (or a single shared one) and one output file per student model.")
+
+    pipeline_advice_answers(args.input_file, args.advice_file, args.advice_api_base, args.advice_model_name,
+                            list(zip(api_bases, model_names, output_files)),
+                            args.advice_max_tokens, args.max_tokens, args.temperature, args.threads,
+                            args.shard_index, args.num_shards, args.shard_balance, args.window,
+                            args.store_dir, args.store_run)
@@ -0,0 +1,110 @@
+from utils import write_jsonl, read_jsonl, record_key
+
+BATCH_URL = "/v1/chat/completions"
+
+
+def batch_custom_id(task, data_item, position):
+    """
+    Stable custom_id for a record: the task name plus the dataset idx (or the line position when idx is missing).
+    """
+    return f"{task}-{record_key(data_item, position)}"
+
+
+def export_batch_requests(batch_file, task, data_list, prepare, model_name, temperature, extra_body=None):
+    """
+    Writes one OpenAI Batch-format request per record, for vLLM's offline entry point
+    (python -m vllm.entrypoints.openai.run_batch -i <batch_file> -o <results_file> --model ...).
+
+    `prepare(data_item)` returns (messages, max_tokens); records with max_tokens None are not exported.
+    `extra_body` is merged into every request body (e.g. utils.QWEN3_EXTRA_BODY).
+    """
+    requests_list = []
+    seen_ids = set()
+    skipped = 0
+    for position, data_item in enumerate(data_list):
+        custom_id = batch_custom_id(task, data_item, position)
+        if custom_id in seen_ids:
+            raise ValueError(f"[ERROR] Duplicate custom_id {custom_id}; the idx values in the input are not unique.")
+        seen_ids.add(custom_id)
+
+        messages, max_tokens = prepare(data_item)
+        if max_tokens is None:
+            skipped += 1
+            continue
+        requests_list.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_URL,
+            "body": {
+                "model": model_name,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                **(extra_body or {})
+            }
+        })
+
+    write_jsonl(batch_file, requests_list)
+    print(f"[INFO] Exported {len(requests_list)} batch requests to {batch_file}"
+          + (f" ({skipped} records without a request skipped)." if skipped else "."))
+
+
+def load_batch_results(results_file, postprocess=None):
+    """
+    Reads a Batch-format results file into a {custom_id: content} dict. Failed requests map to None.
+    `postprocess`, if given, is applied to each successful content (e.g. utils.strip_think).
+    """
+    results = {}
+    for item in read_jsonl(results_file):
+        custom_id = item.get("custom_id")
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        content = None
+        if item.get("error") is None and response.get("status_code", 200) == 200 and body.get("choices"):
+            content = body["choices"][0]["message"]["content"]
+            if postprocess is not None:
+                content = postprocess(content)
+        else:
+            print(f"[ERROR] Batch request {custom_id} failed: {item.get('error') or body}")
+        results[custom_id] = content
+    return results
+
+
+def import_batch_results(results_file, task, data_list, finish, postprocess=None):
+    """
+    Joins a Batch-format results file back onto `data_list` by custom_id.
+    `finish(data_item, response)` builds the usual output record; missing results get a None response.
+    """
+    results = load_batch_results(results_file, postprocess)
+    output_data_list = []
+    missing = 0
+    for position, data_item in enumerate(data_list):
+        custom_id = batch_custom_id(task, data_item, position)
+        if custom_id not in results:
+            missing += 1
+        output_data_list.append(finish(data_item, results.get(custom_id)))
+    if missing:
+        print(f"[WARN] {missing} records have no result in {results_file}.")
+    return output_data_list
+
+
+def add_batch_args(parser):
+    """
+    Adds the --batch_export / --batch_import options shared by all generation and eval scripts.
+    """
+    parser.add_argument("--batch_export", type=str, default=None,
+                        help="Write OpenAI Batch-format requests to this file instead of calling the API.")
+    parser.add_argument("--batch_import", type=str, default=None,
+                        help="Build the outputs from this Batch-format results file instead of calling the API.")
+
+
+def split_batch_paths(value, count):
+    """
+    Splits a comma-separated --batch_export/--batch_import value into one path per input file.
+    """
+    if not value:
+        return [None] * count
+    paths = [f.strip() for f in value.split(',')]
+    if len(paths) != count:
+        raise ValueError(f"[ERROR] Expected {count} batch files, got {len(paths)}: {value}")
+    return paths
@@ -0,0 +1,98 @@
+"""
+End-to-end makespan of the two-phase advice flow versus the item-level pipeline (advice_pipeline.py),
+against stub servers.
+
+    python benchmarks/bench_advice_pipeline.py --items 200 --students 2
+
+Starts one stub advice server and one stub server per student (stub_vllm.py serve with fixed latencies).
+The two-phase flow runs gen_advice to completion and then each student in turn, like
+run_puzzle_pipeline.sh; the pipeline streams every advice record to all students as it is produced.
+Both flows must produce the same answers per idx.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import write_jsonl, read_jsonl, wait_for_server
+from generate_puzzle_advice import gen_advice
+from generate_puzzle_answers_with_advice import gen_answers_with_advice
+from advice_pipeline import pipeline_advice_answers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = "dataset/the_canterbury_puzzles_and_other_curious_problems.jsonl"
+
+
+def start_stub(port, model_name, latency):
+    process = subprocess.Popen([sys.executable, "stub_vllm.py", "serve", "--port", str(port),
+                                "--model_name", model_name, "--latency", str(latency)],
+                               cwd=ROOT, stdout=subprocess.DEVNULL)
+    wait_for_server(f"http://127.0.0.1:{port}", 30)
+    return process
+
+
+def answers_by_idx(path):
+    return {item["idx"]: item["llm_answer"] for item in read_jsonl(path)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark two-phase vs pipelined advice + advised answering.")
+    parser.add_argument("--items", type=int, default=200, help="Number of puzzles (dataset records, repeated).")
+    parser.add_argument("--students", type=int, default=2, help="Number of student models.")
+    parser.add_argument("--threads", type=int, default=16, help="Worker threads per stage.")
+    parser.add_argument("--advice_latency", type=float, default=0.2, help="Stub advice server latency (s).")
+    parser.add_argument("--student_latency", type=float, default=0.1, help="Stub student server latency (s).")
+    parser.add_argument("--port", type=int, default=8310, help="First stub server port.")
+    args = parser.parse_args()
+
+    dataset = list(read_jsonl(os.path.join(ROOT, DATASET)))
+    records = [dict(dataset[i % len(dataset)], idx=i) for i in range(args.items)]
+
+    servers = [start_stub(args.port, "advisor", args.advice_latency)]
+    students = []
+    for i in range(args.students):
+        servers.append(start_stub(args.port + 1 + i, f"student{i}", args.student_latency))
+        students.append((f"http://127.0.0.1:{args.port + 1 + i}", f"student{i}"))
+    advice_api_base = f"http://127.0.0.1:{args.port}"
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "puzzles.jsonl")
+            write_jsonl(input_file, records)
+
+            start = time.perf_counter()
+            advice_file = os.path.join(tmp_dir, "advice_two_phase.jsonl")
+            gen_advice(input_file, advice_file, advice_api_base, "advisor", threads=args.threads)
+            for api_base, model_name in students:
+                gen_answers_with_advice(input_file, advice_file, os.path.join(tmp_dir, f"{model_name}_two_phase.jsonl"),
+                                        api_base, model_name, threads=args.threads)
+            two_phase = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pipeline_advice_answers(input_file, os.path.join(tmp_dir, "advice_pipeline.jsonl"), advice_api_base,
+                                    "advisor",
+                                    [(api_base, model_name, os.path.join(tmp_dir, f"{model_name}_pipeline.jsonl"))
+                                     for api_base, model_name in students],
+                                    threads=args.threads)
+            pipelined = time.perf_counter() - start
+
+            for _, model_name in students:
+                same = (answers_by_idx(os.path.join(tmp_dir, f"{model_name}_two_phase.jsonl"))
+                        == answers_by_idx(os.path.join(tmp_dir, f"{model_name}_pipeline.jsonl")))
+                print(f"{model_name}: answers identical per idx: {same}")
+    finally:
+        for process in servers:
+            process.terminate()
+            process.wait()
+
+    # Lower bound for both: the advice stage alone.
+    advice_only = args.items / args.threads * args.advice_latency
+    print(f"\n{args.items} items, {args.students} students, {args.threads} threads per stage, "
+          f"latency advice {args.advice_latency}s / student {args.student_latency}s")
+    print(f"{'two-phase makespan':<28}{two_phase:8.2f} s")
+    print(f"{'pipelined makespan':<28}{pipelined:8.2f} s  ({two_phase / pipelined:.2f}x)")
+    print(f"{'advice stage alone (ideal)':<28}{advice_only:8.2f} s")
@@ -0,0 +1,61 @@
+"""
+Cold-start time of the per-script entry points and the unified `python -m puzzle_qa_eval` CLI.
+
+    python benchmarks/bench_cli_startup.py --repeat 5
+
+Each command runs in a fresh interpreter; the median wall time is reported. The no-op runs process an
+empty input in batch-export mode, so nothing is sent to a server.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def median_time(command, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            return None, proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"
+    return statistics.median(times), None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CLI cold-start time.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command.")
+    args = parser.parse_args()
+
+    python = sys.executable
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        empty = os.path.join(tmp_dir, "empty.jsonl")
+        open(empty, 'w').close()
+        out = os.path.join(tmp_dir, "out.jsonl")
+        batch = os.path.join(tmp_dir, "batch.jsonl")
+        commands = [
+            ("generate_puzzle_answers.py --help", [python, "generate_puzzle_answers.py", "--help"]),
+            ("eval_puzzle_answers.py --help", [python, "eval_puzzle_answers.py", "--help"]),
+            ("generate_puzzle_answers.py no-op", [python, "generate_puzzle_answers.py", "--input_file", empty,
+                                                  "--output_file", out, "--model_name", "m", "--batch_export", batch]),
+            ("eval_puzzle_answers.py no-op", [python, "eval_puzzle_answers.py", "--path_to_jsonl_list", empty,
+                                              "--output_file_list", out, "--model_name", "m", "--batch_export", batch]),
+            ("puzzle_qa_eval --help", [python, "-m", "puzzle_qa_eval", "--help"]),
+            ("puzzle_qa_eval answer --help", [python, "-m", "puzzle_qa_eval", "answer", "--help"]),
+            ("puzzle_qa_eval answer no-op", [python, "-m", "puzzle_qa_eval", "answer", "--input_file", empty,
+                                             "--output_file", out, "--model_name", "m", "--batch_export", batch]),
+            ("puzzle_qa_eval eval no-op", [python, "-m", "puzzle_qa_eval", "eval", "--input_file", empty,
+                                           "--output_file", out, "--model_name", "m", "--batch_export", batch]),
+        ]
+        for label, command in commands:
+            seconds, error = median_time(command, args.repeat)
+            if seconds is None:
+                print(f"{label:<36} n/a ({error})")
+            else:
+                print(f"{label:<36} {seconds * 1000:8.0f} ms")
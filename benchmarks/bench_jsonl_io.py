@@ -0,0 +1,111 @@
+"""
+Throughput and file size of utils.read_jsonl / write_jsonl on synthetic answer files.
+
+    python benchmarks/bench_jsonl_io.py --num_records 20000
+
+Compares the previous codecs-based implementation (with its validate-and-rewrite pass on every read)
+against the current one for plain, gzip and zstd (if installed) files, with the stdlib and orjson
+(if installed) JSON backends. Each backend runs in its own subprocess (PUZZLE_QA_JSON selects it).
+"""
+import os
+import sys
+import json
+import time
+import codecs
+import random
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_records(num_records, seed=0):
+    rng = random.Random(seed)
+    words = ["puzzle", "answer", "therefore", "coins", "square", "step", "= 12", "verify", "∴", "—"]
+    for idx in range(num_records):
+        yield {
+            "idx": idx,
+            "title": f"Puzzle {idx}",
+            "content": " ".join(rng.choice(words) for _ in range(120)),
+            "answer": " ".join(rng.choice(words) for _ in range(40)),
+            "llm_answer": " ".join(rng.choice(words) for _ in range(600))
+        }
+
+
+def legacy_write_jsonl(file_path, data_list):
+    with codecs.open(file_path, 'w', encoding='utf-8') as f:
+        for item in data_list:
+            json_line = json.dumps(item, ensure_ascii=False)
+            json_line = json_line.encode('utf-8').decode('utf-8')
+            f.write(json_line + '\n')
+
+
+def legacy_read_jsonl(file_path):
+    valid_lines = []
+    with open(file_path, 'r', encoding='utf-8') as infile:
+        for line in infile:
+            if line.strip():
+                json.loads(line)
+                valid_lines.append(line)
+    with open(file_path, 'w', encoding='utf-8') as outfile:
+        outfile.writelines(valid_lines)
+    with codecs.open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def measure(label, write_fn, read_fn, path, records):
+    start = time.perf_counter()
+    write_fn(path, records)
+    write_time = time.perf_counter() - start
+    start = time.perf_counter()
+    count = sum(1 for _ in read_fn(path))
+    read_time = time.perf_counter() - start
+    assert count == len(records)
+    size = os.path.getsize(path)
+    raw = sum(len(json.dumps(item, ensure_ascii=False).encode('utf-8')) + 1 for item in records)
+    print(f"{label:<28} write {raw / write_time / 1e6:7.1f} MB/s   read {raw / read_time / 1e6:7.1f} MB/s   "
+          f"size {size / 1e6:7.2f} MB")
+
+
+def run_backend(num_records, tmp_dir, include_legacy):
+    import utils
+
+    records = list(synthetic_records(num_records))
+    backend = "orjson" if utils.orjson is not None else "json"
+    if include_legacy:
+        measure("legacy codecs + rewrite", legacy_write_jsonl, legacy_read_jsonl,
+                os.path.join(tmp_dir, "legacy.jsonl"), records)
+    extensions = [".jsonl", ".jsonl.gz"]
+    try:
+        import zstandard  # noqa: F401
+        extensions.append(".jsonl.zst")
+    except ImportError:
+        pass
+    for extension in extensions:
+        measure(f"{backend} {extension}", utils.write_jsonl, utils.read_jsonl,
+                os.path.join(tmp_dir, backend + extension), records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSONL read/write throughput and size.")
+    parser.add_argument("--num_records", type=int, default=20000, help="Number of synthetic answer records.")
+    parser.add_argument("--_backend_run", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--_include_legacy", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--_tmp_dir", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._backend_run:
+        run_backend(args.num_records, args._tmp_dir, args._include_legacy)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend, legacy in [("json", True), ("orjson", False)]:
+            command = [sys.executable, os.path.abspath(__file__), "--num_records", str(args.num_records),
+                       "--_backend_run", "--_tmp_dir", tmp_dir]
+            if legacy:
+                command.append("--_include_legacy")
+            subprocess.run(command, check=True, env=dict(os.environ, PUZZLE_QA_JSON=backend))
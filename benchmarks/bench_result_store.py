@@ -0,0 +1,108 @@
+"""
+On-disk size and load time of the denormalized answer/eval JSONL files versus the normalized result store.
+
+    python benchmarks/bench_result_store.py --samples 3
+
+Builds synthetic answer and eval files for both datasets, 4 models, 3 advice variants and `samples`
+samples each (a share of the answers are short and repeated across models, the rest are long and unique),
+writes them in both layouts and times loading every eval record back and computing accuracies.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import write_jsonl, read_jsonl
+from result_store import ResultStore, field_value
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASETS = {"logic": "dataset/fantiasic_logic_puzzles.jsonl",
+            "math": "dataset/the_canterbury_puzzles_and_other_curious_problems.jsonl"}
+MODELS = ["qwen2.5-7b", "qwen2.5-14b-chat", "qwen2.5-32b-chat", "qwen2.5-72b-chat"]
+VARIANTS = ["no_advice", "advice_v2", "advice_v3"]
+SHORT_ANSWERS = ["12", "The answer is 12.", "Seven.", "It cannot be done."]
+
+
+def synthetic_answer(rng):
+    if rng.random() < 0.3:
+        return rng.choice(SHORT_ANSWERS)
+    return " ".join(f"step{rng.randint(0, 10 ** 6)}" for _ in range(rng.randint(150, 400)))
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark denormalized JSONL vs the normalized result store.")
+    parser.add_argument("--samples", type=int, default=3, help="Samples per model and variant.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flat_dir = os.path.join(tmp_dir, "flat")
+        store = ResultStore(os.path.join(tmp_dir, "store"))
+        eval_files = []
+
+        for dataset_name, dataset_path in DATASETS.items():
+            dataset = list(read_jsonl(os.path.join(ROOT, dataset_path)))
+            dataset_key = store.add_dataset(dataset)
+            for model in MODELS:
+                for variant in VARIANTS:
+                    for sample in range(args.samples):
+                        run = f"{variant}/s{sample}"
+                        answers = [dict(item, llm_answer=synthetic_answer(rng)) for item in dataset]
+                        verdicts = [{
+                            "idx": item["idx"],
+                            "puzzle_title": item["title"],
+                            "puzzle_content": item["content"],
+                            "llm_solution": item["llm_answer"],
+                            "reference_solution": item["answer"],
+                            "eval_feedback": f"Evaluation: {rng.random() < 0.4}. Explanation: synthetic.",
+                            "is_correct": rng.random() < 0.4
+                        } for item in answers]
+                        stem = f"{model}_{dataset_name}_{variant}_s{sample}"
+                        write_jsonl(os.path.join(flat_dir, stem + "_answers.jsonl"), answers)
+                        write_jsonl(os.path.join(flat_dir, stem + "_eval.jsonl"), verdicts)
+                        eval_files.append(os.path.join(flat_dir, stem + "_eval.jsonl"))
+                        store.add_answers(dataset_key, model, answers, run)
+                        store.add_verdicts(dataset_key, model, "qwen2.5-72b-chat", verdicts, run)
+
+        print(f"{len(eval_files)} answer files + {len(eval_files)} eval files")
+        print(f"on-disk size: denormalized {dir_size(flat_dir) / 1e6:8.2f} MB   "
+              f"store {dir_size(store.store_dir) / 1e6:8.2f} MB")
+
+        def load_flat():
+            return sum(1 for path in eval_files for _ in read_jsonl(path))
+
+        def load_store():
+            fresh = ResultStore(store.store_dir)
+            return sum(1 for kind, key, model, run in fresh.keys() if kind == "verdicts"
+                       for _ in fresh.export_eval(key, model, run))
+
+        def aggregate_flat():
+            return {path: sum(bool(item["is_correct"]) for item in read_jsonl(path)) for path in eval_files}
+
+        def aggregate_store():
+            totals = {}
+            for item in ResultStore(store.store_dir).iter_verdicts():
+                key = (item["dataset"], item["model"], item["run"])
+                totals[key] = totals.get(key, 0) + bool(field_value(item, "is_correct"))
+            return totals
+
+        for label, flat_fn, store_fn in [("load all eval records", load_flat, load_store),
+                                         ("aggregate accuracy", aggregate_flat, aggregate_store)]:
+            flat_time, _ = timed(flat_fn)
+            store_time, _ = timed(store_fn)
+            print(f"{label:<22} denormalized {flat_time:7.3f}s   store {store_time:7.3f}s")
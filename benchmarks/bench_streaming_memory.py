@@ -0,0 +1,73 @@
+"""
+Peak-memory benchmark for the streaming dispatch mode (--window) on a synthetic dataset.
+
+    python benchmarks/bench_streaming_memory.py --num_records 1000000
+
+Each mode runs gen_answers in a fresh subprocess with chat_completion replaced by an in-process
+fake (no server), and reports wall time and peak RSS.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAKE_ANSWER = "The answer is 12. " * 12
+
+
+def make_dataset(path, num_records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for idx in range(num_records):
+            f.write(json.dumps({
+                "idx": idx,
+                "title": f"Synthetic puzzle {idx}",
+                "content": f"How many ways can {idx % 97} coins be arranged in a row of {idx % 13 + 2}? " * 3,
+                "answer": str(idx % 1000)
+            }) + '\n')
+
+
+def run_mode(input_file, output_file, window, threads):
+    import generate_puzzle_answers
+
+    def fake_chat_completion(api_base, model_name, messages, max_tokens=256, temperature=0.7):
+        return FAKE_ANSWER
+
+    generate_puzzle_answers.chat_completion = fake_chat_completion
+    start = time.perf_counter()
+    generate_puzzle_answers.gen_answers(input_file, output_file, "http://stub", "stub", threads=threads, window=window)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_mb}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of list vs streaming dispatch.")
+    parser.add_argument("--num_records", type=int, default=1000000, help="Number of synthetic records.")
+    parser.add_argument("--threads", type=int, default=10, help="Worker threads.")
+    parser.add_argument("--window", type=int, default=200, help="Window for the streaming mode.")
+    parser.add_argument("--_run_window", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--_input", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--_output", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._input:
+        run_mode(args._input, args._output, args._run_window or None, args.threads)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_file = os.path.join(tmp_dir, "synthetic.jsonl")
+        make_dataset(input_file, args.num_records)
+        print(f"[INFO] {args.num_records} records, {os.path.getsize(input_file) / 1e6:.1f} MB input")
+        for label, window in [("list (no window)", 0), (f"window={args.window}", args.window)]:
+            output_file = os.path.join(tmp_dir, "out", f"answers_{window}.jsonl")
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--threads", str(args.threads),
+                 "--_run_window", str(window), "--_input", input_file, "--_output", output_file],
+                capture_output=True, text=True, check=True)
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"{label:<20} {result['seconds']:8.1f}s  peak RSS {result['peak_rss_mb']:8.1f} MB")
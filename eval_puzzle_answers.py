@@ -1,8 +1,13 @@
-from utils import start_vllm_server, stop_vllm_server, chat_completion, write_jsonl, read_jsonl
+from utils import launch_server, stop_vllm_server, chat_completion, run_records, run_options, add_shard_args, add_window_args
+from prompt_budget import add_budget_args, trim_middle
+from profiling import add_profile_args, make_profiler
+from result_store import add_store_args
+from batch_io import add_batch_args, split_batch_paths
+from judge_cascade import make_cascade, add_cascade_args
+from single_flight import make_single_flight, add_dedupe_args
 import argparse
 import os
 import re
-from concurrent.futures import ThreadPoolExecutor
 
 def extract_rating(response):
     """
@@ -40,14 +45,8 @@ Ensure your explanation clearly justifies your evaluation by pointing out:
 - Any differences in reasoning or approach
 - Any mathematical or logical errors (if present)"""
 
-def eval_puzzle_jsonl(path_to_jsonl, api_base, model_name, max_tokens=512, temperature=0.7, threads=10, output_file=None):
-    def process_data(data_item, api_base, model_name, max_tokens=512, temperature=0.7):
-        puzzle_title = data_item.get("title", "")
-        puzzle_content = data_item.get("content", "")
-        llm_solution = data_item.get("llm_answer", "")
-        reference_solution = data_item.get("answer", "")
-        
-        user_prompt = f"""Puzzle Title: {puzzle_title}
+def build_eval_messages(puzzle_title, puzzle_content, llm_solution, reference_solution):
+    user_prompt = f"""Puzzle Title: {puzzle_title}
 
 Puzzle Description:
 {puzzle_content}
@@ -58,49 +57,96 @@ Solution Attempt:
 Reference Solution:
 {reference_solution}"""
 
-        messages = [
-            {"role": "system", "content": PUZZLE_EVAL_SYS_MSG},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        response = chat_completion(api_base=api_base, model_name=model_name, messages=messages,
-                                   max_tokens=max_tokens, temperature=temperature)
-        
-        is_correct = extract_rating(response)
+    return [
+        {"role": "system", "content": PUZZLE_EVAL_SYS_MSG},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def eval_puzzle_jsonl(path_to_jsonl, api_base, model_name, max_tokens=512, temperature=0.7, threads=10, output_file=None,
+                      small_judge_api_base=None, small_judge_model_name=None, cascade_threshold=0.9,
+                      dedupe=False, dedupe_cache=None, **options):
+    """
+    Judges every `llm_answer` in `path_to_jsonl` against the reference answer. Records without an answer
+    are not judged and keep is_correct None.
+    With a token budget, over-long solution attempts are trimmed in the middle so the judge prompt fits.
+    With `store_dir` set, verdicts are written to a normalized result store keyed by the answering model
+    `store_model` (required); the JSONL output is then only written when `output_file` is given.
+    With `small_judge_model_name` set, judging is cascaded: the small judge grades first and only verdicts
+    below `cascade_threshold` confidence are escalated to `model_name` (see judge_cascade).
+    `options` are the sharding, token budget, batch, window, store and profiler options of utils.run_records.
+    """
+    single_flight = make_single_flight(temperature, dedupe, dedupe_cache)
+    cascade = make_cascade(small_judge_api_base or api_base, small_judge_model_name, cascade_threshold,
+                           single_flight)
+    if cascade is not None and (options.get("batch_export") or options.get("batch_import")):
+        raise ValueError("[ERROR] Cascaded judging needs live servers and cannot be combined with batch mode.")
+
+    def build_messages(data_item, llm_solution=None):
+        # No answer (e.g. the answering run's token budget skipped the prompt): nothing to judge.
+        if data_item.get("llm_answer", "") is None:
+            return None
+        if llm_solution is None:
+            llm_solution = data_item.get("llm_answer", "")
+        return build_eval_messages(data_item.get("title", ""), data_item.get("content", ""), llm_solution,
+                                   data_item.get("answer", ""))
+
+    def trim(data_item, drop_tokens, counter):
+        return build_messages(data_item, trim_middle(data_item.get("llm_answer", ""), counter, drop_tokens))
+
+    def finish(data_item, response):
+        is_correct = extract_rating(response) if response is not None else None
         
         return {
-            "puzzle_title": puzzle_title,
-            "puzzle_content": puzzle_content,
-            "llm_solution": llm_solution,
-            "reference_solution": reference_solution,
+            "idx": data_item.get("idx"),
+            "puzzle_title": data_item.get("title", ""),
+            "puzzle_content": data_item.get("content", ""),
+            "llm_solution": data_item.get("llm_answer", ""),
+            "reference_solution": data_item.get("answer", ""),
             "eval_feedback": response,
             "is_correct": is_correct
         }
+
+    def request(messages, item_max_tokens):
+        def large_judge():
+            return single_flight.call(chat_completion, api_base=api_base, model_name=model_name,
+                                      messages=messages, max_tokens=item_max_tokens, temperature=temperature)
+        if cascade is None:
+            return large_judge(), None
+        return cascade.judge(messages, item_max_tokens, temperature, large_judge)
+
+    total_counter = 0
+    correct_count = 0
+    unanswered_count = 0
     
-    data_list = list(read_jsonl(path_to_jsonl))
-    total_counter = len(data_list)
-    file_name = os.path.splitext(os.path.basename(path_to_jsonl))[0]
+    def tally(results):
+        nonlocal total_counter, correct_count, unanswered_count
+        for result_json in results:
+            total_counter += 1
+            if result_json["llm_solution"] is None:
+                unanswered_count += 1
+            elif result_json["is_correct"] is not None:
+                correct_count += int(result_json["is_correct"])
+            yield result_json
     
-    if output_file is None:
+    if output_file is None and not options.get("store_dir"):
+        file_name = os.path.splitext(os.path.basename(path_to_jsonl))[0]
         output_file = os.path.join("eval_results", file_name + "_eval.jsonl")
     
-    output_list = []
-    correct_count = 0
-    
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [executor.submit(process_data, data_item, api_base, model_name, max_tokens, temperature)
-                   for data_item in data_list]
-        for future in futures:
-            result_json = future.result()
-            if result_json["is_correct"] is not None:
-                correct_count += int(result_json["is_correct"])
-            output_list.append(result_json)
-   
-    write_jsonl(output_file, output_list)
-    print(f'[INFO] Evaluation results have been saved to {output_file}')
+    judge = cascade.label(model_name) if cascade is not None else model_name
+    if not run_records("eval", path_to_jsonl, output_file, build_messages, finish, api_base=api_base,
+                       model_name=model_name, max_tokens=max_tokens, temperature=temperature, threads=threads,
+                       request=request, trim=trim, results_hook=tally, store_judge=judge,
+                       single_flight=single_flight, **options):
+        return
+    if output_file:
+        print(f'[INFO] Evaluation results have been saved to {output_file}')
     if total_counter > 0:
         accuracy = (correct_count / total_counter) * 100
         print(f'[INFO] Accuracy: {accuracy:.2f}% ({correct_count}/{total_counter} correct)')
+    if unanswered_count:
+        print(f"[WARN] {unanswered_count} records have no llm_answer and were not judged (is_correct is None).")
+    if cascade is not None:
+        cascade.report()
     return
 
 if __name__ == "__main__":
@@ -115,20 +161,38 @@ if __name__ == "__main__":
     parser.add_argument('--gpu', type=int, default=1, help='GPU')
     parser.add_argument('--threads', type=int, default=10, help='Threads')
     parser.add_argument('--output_file_list', type=str, default=None, help='List of output file paths')
+    add_shard_args(parser)
+    add_budget_args(parser)
+    add_batch_args(parser)
+    add_window_args(parser)
+    add_store_args(parser)
+    add_cascade_args(parser)
+    add_dedupe_args(parser)
+    add_profile_args(parser)
     
     args = parser.parse_args()
     
-    if args.model_path:
-        process_id = start_vllm_server(args.model_path, args.model_name, args.port, args.gpu)
-        path_json_list = args.path_to_jsonl_list.split(',')
+    path_json_list = args.path_to_jsonl_list.split(',')
+    if args.output_file_list:
         output_file_list = args.output_file_list.split(',')
-        for path_to_jsonl, output_path in zip(path_json_list, output_file_list):
-            eval_puzzle_jsonl(path_to_jsonl, args.api_base, args.model_name, args.max_tokens,
-                       args.temperature, args.threads, output_path)
-        stop_vllm_server(process_id)
     else:
-        path_json_list = args.path_to_jsonl_list.split(',')
-        output_file_list = args.output_file_list.split(',')
-        for path_to_jsonl, output_path in zip(path_json_list, output_file_list):
-            eval_puzzle_jsonl(path_to_jsonl, args.api_base, args.model_name, args.max_tokens,
-                       args.temperature, args.threads, output_path) 
\ No newline at end of file
+        output_file_list = [None] * len(path_json_list)
+    batch_exports = split_batch_paths(args.batch_export, len(path_json_list))
+    batch_imports = split_batch_paths(args.batch_import, len(path_json_list))
+    
+    profiler = make_profiler(args)
+    options = run_options(args, profiler)
+    process_id = launch_server(args)
+    
+    for path_to_jsonl, output_path, batch_export, batch_import in zip(
+            path_json_list, output_file_list, batch_exports, batch_imports):
+        eval_puzzle_jsonl(path_to_jsonl, args.api_base, args.model_name, max_tokens=args.max_tokens,
+                          temperature=args.temperature, threads=args.threads, output_file=output_path,
+                          small_judge_api_base=args.small_judge_api_base,
+                          small_judge_model_name=args.small_judge_model_name,
+                          cascade_threshold=args.cascade_threshold,
+                          batch_export=batch_export, batch_import=batch_import, **options)
+    
+    if process_id:
+        stop_vllm_server(process_id)
+    profiler.report()
@@ -1,6 +1,9 @@
-from utils import start_vllm_server, stop_vllm_server, chat_completion_qwen3, write_jsonl, read_jsonl
+from utils import launch_server, stop_vllm_server, chat_completion_qwen3, QWEN3_EXTRA_BODY, strip_think, run_records, run_options, add_shard_args, add_window_args
+from prompt_budget import add_budget_args
+from profiling import add_profile_args, make_profiler
+from batch_io import add_batch_args
+from single_flight import add_dedupe_args
 import argparse
-from concurrent.futures import ThreadPoolExecutor
 import os
 
 SYSTEM_PROMPT = """You are an Expert Puzzle Solving Guide. Your task is to:
@@ -23,14 +26,15 @@ Your advice should:
 - Be written in clear, accessible language for students.
 """
 
-def gen_advice(input_file, output_file, api_base, model_name, max_tokens=512, temperature=0.7, threads=10):
+def gen_advice(input_file, output_file, api_base, model_name, max_tokens=512, temperature=0.7, threads=10,
+               advice_sinks=None, **options):
     """
     Generates puzzle-solving advice using a larger LLM.
+    `advice_sinks` are callables that get each advice record as soon as it is generated (see advice_pipeline);
+    the output file is then written in completion order.
+    `options` are the sharding, token budget, batch, window, dedupe and profiler options of utils.run_records.
     """
-    input_data_list = list(read_jsonl(input_file))
-    output_data_list = []
-
-    def process_data(data_item, api_base, model_name, max_tokens=1024, temperature=0.7):
+    def build_messages(data_item):
         # Get the puzzle content
         title = data_item.get("title", "")
         content = data_item.get("content", "")
@@ -38,31 +42,22 @@ def gen_advice(input_file, output_file, api_base, model_name, max_tokens=512, te
         # Create a prompt that asks for general advice
         prompt = f"Title: {title}\n\nPuzzle:\n{content}\n\nPlease provide brief, focused advice on how to approach and solve this type of puzzle. Focus on the logical structure and 2-3 key concepts that would help someone solve similar puzzles. Be concise (300-400 words maximum)."
         
-        messages = [
+        return [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ]
-        
-        # Call the chat completion helper
-        response = chat_completion_qwen3(api_base=api_base, model_name=model_name, messages=messages,
-                                 max_tokens=max_tokens, temperature=temperature)
-        
+
+    def finish(data_item, response):
         # Store the original data and add the advice
         output_item = data_item.copy()
         output_item["solving_advice"] = response
         return output_item
 
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [
-            executor.submit(process_data, data_item, api_base, model_name, max_tokens, temperature)
-            for data_item in input_data_list
-        ]
-        for future in futures:
-            output_data_list.append(future.result())
-
-    write_jsonl(output_file, output_data_list)
-    print(f"[INFO] Advice generation complete. Results saved to {output_file}.")
-    return
+    if run_records("advice", input_file, output_file, build_messages, finish, api_base=api_base,
+                   model_name=model_name, max_tokens=max_tokens, temperature=temperature, threads=threads,
+                   complete_fn=chat_completion_qwen3, ordered=not advice_sinks, sinks=advice_sinks,
+                   extra_body=QWEN3_EXTRA_BODY, postprocess=strip_think, **options):
+        print(f"[INFO] Advice generation complete. Results saved to {output_file}.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate puzzle-solving advice using vLLM.")
@@ -76,14 +71,20 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=8000, help="Port to host the model on.")
     parser.add_argument("--gpu", type=int, default=1, help="Number of GPUs to use.")
     parser.add_argument("--threads", type=int, default=10, help="Number of threads to use for generation.")
+    add_shard_args(parser)
+    add_budget_args(parser)
+    add_batch_args(parser)
+    add_window_args(parser)
+    add_dedupe_args(parser)
+    add_profile_args(parser)
     
     args = parser.parse_args()
     
-    if args.model_path:
-        process_id = start_vllm_server(args.model_path, args.model_name, args.port, args.gpu)
-        gen_advice(args.input_file, args.output_file, args.api_base, args.model_name,
-                  args.max_tokens, args.temperature, args.threads)
+    profiler = make_profiler(args)
+    process_id = launch_server(args)
+    gen_advice(args.input_file, args.output_file, args.api_base, args.model_name,
+               max_tokens=args.max_tokens, temperature=args.temperature, threads=args.threads,
+               batch_export=args.batch_export, batch_import=args.batch_import, **run_options(args, profiler))
+    if process_id:
         stop_vllm_server(process_id)
-    else:
-        gen_advice(args.input_file, args.output_file, args.api_base, args.model_name,
-                  args.max_tokens, args.temperature, args.threads) 
\ No newline at end of file
+    profiler.report()
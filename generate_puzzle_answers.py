@@ -1,6 +1,10 @@
-from utils import start_vllm_server, stop_vllm_server, chat_completion, write_jsonl, read_jsonl
+from utils import launch_server, stop_vllm_server, chat_completion, run_records, run_options, add_shard_args, add_window_args
+from prompt_budget import add_budget_args
+from profiling import add_profile_args, make_profiler
+from result_store import add_store_args
+from batch_io import add_batch_args, split_batch_paths
+from single_flight import add_dedupe_args
 import argparse
-from concurrent.futures import ThreadPoolExecutor
 import os
 
 # Mapping from dataset type to tailored system prompts
@@ -32,10 +36,13 @@ Remember to:
 - Check for edge cases and special conditions"""
 }
 
-def gen_answers(input_file, output_file, api_base, model_name, max_tokens=1024, temperature=0.7, threads=10):
+def gen_answers(input_file, output_file, api_base, model_name, max_tokens=1024, temperature=0.7, threads=10,
+                **options):
     """
     Generates answers for puzzle datasets using tailored system prompts.
     The dataset type is derived from the input file name.
+    `options` are the sharding, token budget, batch, window, store, dedupe and profiler options of
+    utils.run_records.
     """
     # Derive the puzzle type from the input filename
     base_name = os.path.basename(input_file).lower()
@@ -45,11 +52,8 @@ def gen_answers(input_file, output_file, api_base, model_name, max_tokens=1024,
         puzzle_type = "mathematical"
     
     system_prompt = SYSTEM_PROMPTS[puzzle_type]
-    
-    input_data_list = list(read_jsonl(input_file))
-    output_data_list = []
 
-    def process_data(data_item, api_base, model_name, max_tokens=1024, temperature=0.7):
+    def build_messages(data_item):
         # Get the puzzle content
         title = data_item.get("title", "")
         content = data_item.get("content", "")
@@ -57,31 +61,21 @@ def gen_answers(input_file, output_file, api_base, model_name, max_tokens=1024,
         # Create a clear prompt that includes both title and content
         prompt = f"Title: {title}\n\nPuzzle:\n{content}\n\nPlease solve this puzzle step by step."
         
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt}
         ]
-        
-        # Call the chat completion helper
-        response = chat_completion(api_base=api_base, model_name=model_name, messages=messages,
-                                 max_tokens=max_tokens, temperature=temperature)
-        
+
+    def finish(data_item, response):
         # Store the original data and add the LLM's response
         output_item = data_item.copy()
         output_item["llm_answer"] = response
         return output_item
 
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [
-            executor.submit(process_data, data_item, api_base, model_name, max_tokens, temperature)
-            for data_item in input_data_list
-        ]
-        for future in futures:
-            output_data_list.append(future.result())
-
-    write_jsonl(output_file, output_data_list)
-    print(f"[INFO] Generation complete. Results saved to {output_file}.")
-    return
+    if run_records("answer", input_file, output_file, build_messages, finish, api_base=api_base,
+                   model_name=model_name, max_tokens=max_tokens, temperature=temperature, threads=threads,
+                   complete_fn=chat_completion, **options):
+        print(f"[INFO] Generation complete. Results saved to {output_file}.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate answers for puzzle datasets using vLLM.")
@@ -95,29 +89,34 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=8000, help="Port to host the model on.")
     parser.add_argument("--gpu", type=int, default=1, help="Number of GPUs to use.")
     parser.add_argument("--threads", type=int, default=10, help="Number of threads to use for generation.")
+    add_shard_args(parser)
+    add_budget_args(parser)
+    add_batch_args(parser)
+    add_window_args(parser)
+    add_store_args(parser)
+    add_dedupe_args(parser)
+    add_profile_args(parser)
     
     args = parser.parse_args()
     
-    if args.model_path:
-        process_id = start_vllm_server(args.model_path, args.model_name, args.port, args.gpu)
-        
-        if ',' in args.input_file and ',' in args.output_file:
-            input_files = [f.strip() for f in args.input_file.split(',')]
-            output_files = [f.strip() for f in args.output_file.split(',')]
-            for i in range(len(input_files)):
-                gen_answers(input_files[i], output_files[i], args.api_base, args.model_name,
-                          args.max_tokens, args.temperature, args.threads)
-        else:
-            gen_answers(args.input_file, args.output_file, args.api_base, args.model_name,
-                      args.max_tokens, args.temperature, args.threads)
-        stop_vllm_server(process_id)
+    if ',' in args.input_file and ',' in args.output_file:
+        input_files = [f.strip() for f in args.input_file.split(',')]
+        output_files = [f.strip() for f in args.output_file.split(',')]
     else:
-        if ',' in args.input_file and ',' in args.output_file:
-            input_files = [f.strip() for f in args.input_file.split(',')]
-            output_files = [f.strip() for f in args.output_file.split(',')]
-            for i in range(len(input_files)):
-                gen_answers(input_files[i], output_files[i], args.api_base, args.model_name,
-                          args.max_tokens, args.temperature, args.threads)
-        else:
-            gen_answers(args.input_file, args.output_file, args.api_base, args.model_name,
-                      args.max_tokens, args.temperature, args.threads) 
\ No newline at end of file
+        input_files = [args.input_file]
+        output_files = [args.output_file]
+    batch_exports = split_batch_paths(args.batch_export, len(input_files))
+    batch_imports = split_batch_paths(args.batch_import, len(input_files))
+    
+    profiler = make_profiler(args)
+    options = run_options(args, profiler)
+    process_id = launch_server(args)
+    
+    for i in range(len(input_files)):
+        gen_answers(input_files[i], output_files[i], args.api_base, args.model_name,
+                    max_tokens=args.max_tokens, temperature=args.temperature, threads=args.threads,
+                    batch_export=batch_exports[i], batch_import=batch_imports[i], **options)
+    
+    if process_id:
+        stop_vllm_server(process_id)
+    profiler.report()
@@ -1,6 +1,10 @@
-from utils import start_vllm_server, stop_vllm_server, chat_completion, write_jsonl, read_jsonl
+from utils import launch_server, stop_vllm_server, chat_completion, read_jsonl, run_records, run_options, add_shard_args, add_window_args
+from prompt_budget import add_budget_args
+from profiling import add_profile_args, make_profiler
+from result_store import add_store_args
+from batch_io import add_batch_args, split_batch_paths
+from single_flight import add_dedupe_args
 import argparse
-from concurrent.futures import ThreadPoolExecutor
 import os
 
 # Mapping from dataset type to tailored system prompts
@@ -30,10 +34,47 @@ Remember to:
 - Verify your solution works"""
 }
 
-def gen_answers_with_advice(input_file, advice_file, output_file, api_base, model_name, max_tokens=1024, temperature=0.7, threads=10):
+NO_ADVICE = "No specific advice available for this puzzle."
+
+def load_advice(advice_file):
+    """
+    Reads an advice file into {idx: advice}. Advice records without an idx (older advice files)
+    are returned separately as {title: advice}. Missing advice (None, e.g. a prompt skipped by the
+    advice run's token budget or a failed batch request) is kept as None; see advice_text.
+    """
+    advice_by_idx, advice_by_title = {}, {}
+    duplicates = missing = 0
+    for item in read_jsonl(advice_file):
+        missing += item.get("solving_advice", "") is None
+        if "idx" in item:
+            duplicates += item["idx"] in advice_by_idx
+            advice_by_idx[item["idx"]] = item.get("solving_advice", "")
+        else:
+            advice_by_title[item.get("title", "")] = item.get("solving_advice", "")
+    if duplicates:
+        print(f"[WARN] {duplicates} duplicate idx values in {advice_file}; the last advice for each is used.")
+    if advice_by_title:
+        print(f"[WARN] {len(advice_by_title)} advice records in {advice_file} have no idx and are matched by title.")
+    if missing:
+        print(f"[WARN] {missing} advice records in {advice_file} have no advice; those puzzles get the no-advice prompt.")
+    return advice_by_idx, advice_by_title
+
+def advice_text(advice):
+    """
+    Returns the advice to put into the student prompt, NO_ADVICE when there is none.
+    """
+    return NO_ADVICE if advice is None else advice
+
+def gen_answers_with_advice(input_file, advice_file, output_file, api_base, model_name, max_tokens=1024, temperature=0.7, threads=10,
+                            **options):
     """
     Generates answers for puzzle datasets using advice from a larger LLM.
     The dataset type is derived from the input file name.
+    Advice is matched to puzzles by dataset idx. `advice_file` may also be an iterable of advice records
+    (gen_advice output, see advice_pipeline): those records are then the puzzles to answer, each is answered
+    as soon as it arrives, and the output is written in completion order.
+    `options` are the sharding, token budget, batch, window, store, dedupe and profiler options of
+    utils.run_records; `store_dir` may also be a ResultStore shared with other runs.
     """
     # Derive the puzzle type from the input filename
     base_name = os.path.basename(input_file).lower()
@@ -44,18 +85,23 @@ def gen_answers_with_advice(input_file, advice_file, output_file, api_base, mode
     
     system_prompt = SYSTEM_PROMPTS[puzzle_type]
     
-    # Load both input data and advice
-    input_data_list = list(read_jsonl(input_file))
-    advice_data = {item.get("title", ""): item.get("solving_advice", "") 
-                  for item in read_jsonl(advice_file)}
+    # Advice records are copies of the (already sharded) input records.
+    streaming = not isinstance(advice_file, str)
+    if not streaming:
+        advice_by_idx, advice_by_title = load_advice(advice_file)
     
-    output_data_list = []
+    def get_advice(data_item):
+        if streaming:
+            return advice_text(data_item.get("solving_advice"))
+        if data_item.get("idx") in advice_by_idx:
+            return advice_text(advice_by_idx[data_item["idx"]])
+        return advice_text(advice_by_title.get(data_item.get("title", "")))
 
-    def process_data(data_item, api_base, model_name, max_tokens=1024, temperature=0.7):
+    def build_messages(data_item):
         # Get the puzzle content and advice
         title = data_item.get("title", "")
         content = data_item.get("content", "")
-        advice = advice_data.get(title, "No specific advice available for this puzzle.")
+        advice = get_advice(data_item)
         
         # Create a prompt that includes both the puzzle and the advice
         prompt = f"""Title: {title}
@@ -68,31 +114,24 @@ Solving Advice:
 
 Please solve this puzzle by following the advice above. Show your work step by step."""
 
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt}
         ]
-        
-        # Call the chat completion helper
-        response = chat_completion(api_base=api_base, model_name=model_name, messages=messages,
-                                 max_tokens=max_tokens, temperature=temperature)
-        
+
+    def finish(data_item, response):
         # Store the original data and add the LLM's response
         output_item = data_item.copy()
+        if streaming:
+            output_item.pop("solving_advice", None)
         output_item["llm_answer"] = response
         return output_item
 
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [
-            executor.submit(process_data, data_item, api_base, model_name, max_tokens, temperature)
-            for data_item in input_data_list
-        ]
-        for future in futures:
-            output_data_list.append(future.result())
-
-    write_jsonl(output_file, output_data_list)
-    print(f"[INFO] Generation complete. Results saved to {output_file}.")
-    return
+    if run_records("answer_with_advice", input_file, output_file, build_messages, finish, api_base=api_base,
+                   model_name=model_name, max_tokens=max_tokens, temperature=temperature, threads=threads,
+                   complete_fn=chat_completion, records=advice_file if streaming else None,
+                   ordered=not streaming, **options):
+        print(f"[INFO] Generation complete. Results saved to {output_file}.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate answers for puzzle datasets using advice from a larger LLM.")
@@ -107,6 +146,13 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=8000, help="Port to host the model on.")
     parser.add_argument("--gpu", type=int, default=1, help="Number of GPUs to use.")
     parser.add_argument("--threads", type=int, default=10, help="Number of threads to use for generation.")
+    add_shard_args(parser)
+    add_budget_args(parser)
+    add_batch_args(parser)
+    add_window_args(parser)
+    add_store_args(parser)
+    add_dedupe_args(parser)
+    add_profile_args(parser)
     
     args = parser.parse_args()
     
@@ -124,20 +170,20 @@ if __name__ == "__main__":
         advice_files = args.advice_file.split(",")
     else:
         advice_files = [args.advice_file]
-        
     
-    if args.model_path:
-        process_id = start_vllm_server(args.model_path, args.model_name, args.port, args.gpu)
-        for input_file, output_file, advice_file in zip(input_files, output_files, advice_files):
-            gen_answers_with_advice(input_file, advice_file, output_file, 
-                                  args.api_base, args.model_name, args.max_tokens, 
-                                  args.temperature, args.threads)
+    batch_exports = split_batch_paths(args.batch_export, len(input_files))
+    batch_imports = split_batch_paths(args.batch_import, len(input_files))
+    profiler = make_profiler(args)
+    options = run_options(args, profiler)
+    process_id = launch_server(args)
+    for input_file, output_file, advice_file, batch_export, batch_import in zip(
+            input_files, output_files, advice_files, batch_exports, batch_imports):
+        gen_answers_with_advice(input_file, advice_file, output_file, args.api_base, args.model_name,
+                                max_tokens=args.max_tokens, temperature=args.temperature, threads=args.threads,
+                                batch_export=batch_export, batch_import=batch_import, **options)
+    if process_id:
         stop_vllm_server(process_id)
-    else:
-        for input_file, output_file, advice_file in zip(input_files, output_files, advice_files):
-            gen_answers_with_advice(input_file, advice_file, output_file, 
-                                  args.api_base, args.model_name, args.max_tokens, 
-                                  args.temperature, args.threads)
+    profiler.report()
         
     # if args.model_path:
     #     process_id = start_vllm_server(args.model_path, args.model_name, args.port, args.gpu)
@@ -0,0 +1,218 @@
+"""
+Two-tier judging: a small judge grades every item first and only low-confidence verdicts go to the large judge.
+
+The small judge's confidence is read from the token logprobs of its "Evaluation: True/False" verdict:
+the probability of the verdict it gave, normalized over the True and False alternatives at that token.
+Items at or above the threshold keep the small verdict; the rest (and any reply without a parsable
+verdict or without logprobs) are escalated. Each eval record then carries
+
+    judge_tier        "small" or "large", the tier whose verdict is in is_correct
+    judge_confidence  the small judge's confidence (None when it could not be measured)
+    small_is_correct  the small judge's verdict, kept for escalated items too
+
+which is enough to compare against an all-large-judge run and to replay other thresholds:
+
+    python judge_cascade.py --cascade_file eval_cascade.jsonl --reference_file eval_large.jsonl
+"""
+import re
+import math
+import argparse
+import threading
+
+from utils import chat_completion_logprobs, read_jsonl, record_key
+from single_flight import SingleFlight
+
+VERDICT_PATTERN = re.compile(r'Evaluation\s*:\s*(True|False)', re.IGNORECASE)
+CONFIDENCE_BINS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0]
+SWEEP_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+def _verdict_class(token):
+    word = token.strip().lower()
+    if not word:
+        return None
+    if "true".startswith(word) or word.startswith("true"):
+        return True
+    if "false".startswith(word) or word.startswith("false"):
+        return False
+    return None
+
+
+def verdict_confidence(response, tokens):
+    """
+    Returns (verdict, confidence) for a judge reply and its token logprobs (see utils.chat_completion_logprobs).
+    confidence is p(verdict) / (p(True) + p(False)) at the token where the verdict starts, or None when
+    the reply has no verdict, no logprobs, or the verdict token cannot be located.
+    """
+    m = VERDICT_PATTERN.search(response or "")
+    if not m:
+        return None, None
+    verdict = m.group(1).lower() == 'true'
+    if not tokens:
+        return verdict, None
+
+    offset = 0
+    for entry in tokens:
+        offset += len(entry["token"])
+        if offset <= m.start(1):
+            continue
+        alternatives = dict(entry["top_logprobs"])
+        alternatives.setdefault(entry["token"], entry["logprob"])
+        mass = {True: 0.0, False: 0.0}
+        for token, logprob in alternatives.items():
+            token_class = _verdict_class(token)
+            if token_class is not None:
+                mass[token_class] += math.exp(logprob)
+        total = mass[True] + mass[False]
+        if total == 0.0:
+            return verdict, None
+        return verdict, mass[verdict] / total
+    return verdict, None
+
+
+class JudgeCascade:
+    """
+    Grades with the small judge and escalates to the large judge below `threshold` confidence.
+    Small-judge requests go through `single_flight` (see single_flight), like the large-judge requests.
+    Thread-safe; counts how many verdicts each tier made.
+    """
+
+    def __init__(self, api_base, model_name, threshold=0.9, single_flight=None):
+        self.api_base = api_base
+        self.model_name = model_name
+        self.threshold = threshold
+        self.single_flight = single_flight or SingleFlight()
+        self.lock = threading.Lock()
+        self.counts = {"small": 0, "large": 0, "no_confidence": 0}
+
+    def judge(self, messages, max_tokens, temperature, escalate):
+        """
+        Returns (response, cascade_fields). `escalate()` runs the large judge and returns its reply.
+        """
+        response, tokens = self.single_flight.call(chat_completion_logprobs, api_base=self.api_base,
+                                                   model_name=self.model_name, messages=messages,
+                                                   max_tokens=max_tokens, temperature=temperature)
+        small_verdict, confidence = verdict_confidence(response, tokens)
+        tier = "small" if confidence is not None and confidence >= self.threshold else "large"
+        with self.lock:
+            self.counts[tier] += 1
+            if confidence is None:
+                self.counts["no_confidence"] += 1
+        if tier == "large":
+            response = escalate()
+        return response, {"judge_tier": tier, "judge_confidence": confidence, "small_is_correct": small_verdict}
+
+    def label(self, large_model_name):
+        return f"{self.model_name}>{large_model_name}@{self.threshold:g}"
+
+    def report(self):
+        total = self.counts["small"] + self.counts["large"]
+        if total == 0:
+            return
+        print(f"[INFO] Cascade: {self.counts['small']}/{total} verdicts from {self.model_name} "
+              f"(threshold {self.threshold:g}), {self.counts['large']} escalated "
+              f"({self.counts['small'] / total * 100:.1f}% of large-judge calls avoided; "
+              f"{self.counts['no_confidence']} without a measurable confidence).")
+
+
+def make_cascade(api_base, model_name, threshold=0.9, single_flight=None):
+    if not model_name:
+        return None
+    return JudgeCascade(api_base, model_name, threshold, single_flight)
+
+
+def add_cascade_args(parser):
+    """
+    Adds the --small_judge_api_base / --small_judge_model_name / --cascade_threshold options of the eval script.
+    """
+    parser.add_argument("--small_judge_api_base", type=str, default=None,
+                        help="API base of the small first-tier judge (must return logprobs).")
+    parser.add_argument("--small_judge_model_name", type=str, default=None,
+                        help="Enable cascaded judging with this small judge model.")
+    parser.add_argument("--cascade_threshold", type=float, default=0.9,
+                        help="Escalate to the large judge when the small judge's confidence is below this.")
+
+
+def _agreement(pairs):
+    return (sum(1 for a, b in pairs if a == b) / len(pairs) * 100) if pairs else 0.0
+
+
+def calibration_report(cascade_file, reference_file, thresholds=SWEEP_THRESHOLDS):
+    """
+    Compares a cascaded eval run with an all-large-judge eval run of the same answers.
+    Returns the report text: overall and per-tier agreement, large-judge traffic avoided, agreement of the
+    small judge by confidence bin, and a replay of other thresholds.
+    """
+    reference = {record_key(item, pos): item.get("is_correct") for pos, item in enumerate(read_jsonl(reference_file))}
+    rows = []
+    for pos, item in enumerate(read_jsonl(cascade_file)):
+        key = record_key(item, pos)
+        if key in reference and "judge_tier" in item:
+            rows.append((item, reference[key]))
+    if not rows:
+        return f"No cascaded records in {cascade_file} match {reference_file}.\n"
+
+    total = len(rows)
+    small_rows = [(item, large) for item, large in rows if item["judge_tier"] == "small"]
+    large_rows = [(item, large) for item, large in rows if item["judge_tier"] == "large"]
+    lines = [
+        f"Cascade file:   {cascade_file}",
+        f"Reference file: {reference_file} (all large judge)",
+        f"Matched items:  {total}",
+        "",
+        f"Agreement with the large judge: {_agreement([(i['is_correct'], l) for i, l in rows]):.2f}% overall, "
+        f"{_agreement([(i['is_correct'], l) for i, l in small_rows]):.2f}% on {len(small_rows)} small-judge verdicts, "
+        f"{_agreement([(i['is_correct'], l) for i, l in large_rows]):.2f}% on {len(large_rows)} escalated items",
+        f"Large-judge calls avoided: {len(small_rows)}/{total} ({len(small_rows) / total * 100:.1f}%)",
+        "",
+        "Small judge agreement by confidence:",
+        f"{'confidence':<16}{'items':>8}{'agree %':>10}",
+    ]
+
+    bins = {}
+    for item, large in rows:
+        confidence = item.get("judge_confidence")
+        if confidence is None:
+            label = "unmeasured"
+        else:
+            # The last bin is closed so that confidence 1.0 lands in it.
+            low = max(edge for edge in CONFIDENCE_BINS[:-1] if edge <= confidence) if confidence >= CONFIDENCE_BINS[0] else 0.0
+            high = min([edge for edge in CONFIDENCE_BINS if edge > low] or [1.0])
+            label = f"[{low:.2f}, {high:.2f}{']' if high == 1.0 else ')'}"
+        bins.setdefault(label, []).append((item["small_is_correct"], large))
+    for label in sorted(bins, key=lambda label: (label == "unmeasured", label)):
+        pairs = bins[label]
+        lines.append(f"{label:<16}{len(pairs):>8}{_agreement(pairs):>10.2f}")
+
+    # Escalated items are assumed to get the reference verdict, so this replays each threshold exactly
+    # when the large judge is deterministic (temperature 0).
+    lines += ["", "Threshold replay (escalated items take the reference verdict):",
+              f"{'threshold':<12}{'avoided %':>11}{'agree %':>10}"]
+    for threshold in thresholds:
+        pairs = []
+        avoided = 0
+        for item, large in rows:
+            confidence = item.get("judge_confidence")
+            if confidence is not None and confidence >= threshold:
+                avoided += 1
+                pairs.append((item["small_is_correct"], large))
+            else:
+                pairs.append((large, large))
+        lines.append(f"{threshold:<12g}{avoided / total * 100:>11.1f}{_agreement(pairs):>10.2f}")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibration report of a cascaded eval run against an all-large-judge run.")
+    parser.add_argument("--cascade_file", type=str, required=True, help="Eval JSONL written with --small_judge_model_name.")
+    parser.add_argument("--reference_file", type=str, required=True, help="Eval JSONL of the same answers judged by the large judge only.")
+    parser.add_argument("--output_file", type=str, default=None, help="Also write the report to this file.")
+
+    args = parser.parse_args()
+
+    text = calibration_report(args.cascade_file, args.reference_file)
+    print(text, end="")
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"[INFO] Calibration report saved to {args.output_file}.")
@@ -0,0 +1,62 @@
+from utils import write_jsonl, read_jsonl, shard_key
+import argparse
+
+
+def merge_shards(shard_files, reference_file, output_file):
+    """
+    Merges the outputs of a sharded run (--shard_index / --num_shards) into one file.
+
+    The reference file is the input of the sharded run (the dataset, or the answer file for eval).
+    Every reference idx must appear in exactly one shard output; the merged file follows the
+    reference order, so it matches the output of an unsharded run.
+    """
+    reference_keys = [shard_key(item) for item in read_jsonl(reference_file)]
+    expected = set(reference_keys)
+    if len(expected) != len(reference_keys):
+        raise ValueError(f"[ERROR] Reference file {reference_file} contains duplicate idx values.")
+
+    merged = {}
+    duplicates = []
+    unexpected = []
+    for shard_file in shard_files:
+        for item in read_jsonl(shard_file):
+            key = item.get("idx")
+            if key not in expected:
+                unexpected.append((shard_file, key))
+            elif key in merged:
+                duplicates.append((shard_file, key))
+            else:
+                merged[key] = item
+
+    missing = [key for key in reference_keys if key not in merged]
+    if duplicates or unexpected or missing:
+        for shard_file, key in duplicates:
+            print(f"[ERROR] Duplicate idx {key} in {shard_file}")
+        for shard_file, key in unexpected:
+            print(f"[ERROR] idx {key} in {shard_file} is not part of {reference_file}")
+        if missing:
+            print(f"[ERROR] {len(missing)} idx values missing from the shard outputs: {missing[:20]}")
+        raise RuntimeError(f"[ERROR] Shard outputs do not cover {reference_file} exactly once; nothing written.")
+
+    output_list = [merged[key] for key in reference_keys]
+    write_jsonl(output_file, output_list)
+    print(f"[INFO] Merged {len(shard_files)} shards ({len(output_list)} records) into {output_file}.")
+
+    verdicts = [item["is_correct"] for item in output_list if "is_correct" in item]
+    if verdicts:
+        correct_count = sum(1 for verdict in verdicts if verdict)
+        accuracy = (correct_count / len(output_list)) * 100
+        print(f'[INFO] Accuracy: {accuracy:.2f}% ({correct_count}/{len(output_list)} correct)')
+    return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge and validate the outputs of a sharded run.")
+    parser.add_argument("--shard_files", type=str, help="Comma-separated list of shard output JSONL files.")
+    parser.add_argument("--reference_file", type=str, help="Input JSONL file of the sharded run (defines idx order).")
+    parser.add_argument("--output_file", type=str, help="Path to the merged output JSONL file.")
+
+    args = parser.parse_args()
+
+    shard_files = [f.strip() for f in args.shard_files.split(',')]
+    merge_shards(shard_files, args.reference_file, args.output_file)
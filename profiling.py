@@ -0,0 +1,202 @@
+import io
+import os
+import time
+import sys
+import signal
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+# Stages recorded by the scripts, grouped for the report totals.
+# "network" is time spent waiting on the server. "queue_wait" is time a task waits for a free worker, which
+# grows with server latency, so it is reported as backlog rather than client time. "stream_output" is the
+# whole --window dispatch-and-write loop; it overlaps "network" and is reported on its own.
+CLIENT_STAGES = ["read_input", "build_prompt", "parse_response", "write_output"]
+SERVER_STAGES = ["network"]
+BACKLOG_STAGES = ["queue_wait"]
+STREAMING_STAGES = ["stream_output"]
+# From Python 3.12 cProfile is built on the process-wide sys.monitoring: one profile sees every thread, and
+# enabling a second one while it runs raises ValueError. Older versions need one profile per thread.
+PROCESS_WIDE_CPROFILE = sys.version_info >= (3, 12)
+
+STAGE_GROUPS = [("Client-side", CLIENT_STAGES), ("server/network", SERVER_STAGES),
+                ("concurrency/backlog", BACKLOG_STAGES), ("streaming loop (overlaps network)", STREAMING_STAGES)]
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Lightweight per-stage timers, with optional cProfile and tracemalloc.
+
+    A disabled profiler hands out a shared no-op context manager and submits work to the executor
+    unchanged, so leaving the calls in place costs next to nothing.
+    Stage times are summed across worker threads, so they can exceed the wall time.
+    """
+
+    def __init__(self, report_file=None, use_cprofile=False, use_tracemalloc=False, top_n=25):
+        self.enabled = report_file is not None
+        self.report_file = report_file
+        self.use_cprofile = self.enabled and use_cprofile
+        self.use_tracemalloc = self.enabled and use_tracemalloc
+        self.top_n = top_n
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.snapshots = []
+        self.thread_profiles = []
+        self.local = threading.local()
+        self.start_time = time.perf_counter()
+
+        if self.use_tracemalloc:
+            tracemalloc.start()
+            # `kill -USR1 <pid>` records an allocation snapshot mid-run.
+            if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGUSR1, lambda signum, frame: self.snapshot("SIGUSR1"))
+        self.main_profile = None
+        if self.use_cprofile:
+            self.main_profile = self._thread_profile()
+            self.main_profile.enable()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        with self.lock:
+            count, total, longest = self.stages.get(name, (0, 0.0, 0.0))
+            self.stages[name] = (count + 1, total + seconds, max(longest, seconds))
+
+    def _thread_profile(self):
+        profile = getattr(self.local, "profile", None)
+        if profile is None:
+            profile = self.local.profile = cProfile.Profile()
+            with self.lock:
+                self.thread_profiles.append(profile)
+        return profile
+
+    def submit(self, executor, fn, *args):
+        """
+        executor.submit(fn, *args), recording the time each task waits for a free worker ("queue_wait")
+        and profiling the worker with cProfile when enabled (before Python 3.12; later versions profile all
+        threads with the profile started in __init__).
+        """
+        if not self.enabled:
+            return executor.submit(fn, *args)
+        submitted = time.perf_counter()
+
+        def run():
+            self.add("queue_wait", time.perf_counter() - submitted)
+            if not self.use_cprofile or PROCESS_WIDE_CPROFILE:
+                return fn(*args)
+            profile = self._thread_profile()
+            profile.enable()
+            try:
+                return fn(*args)
+            finally:
+                profile.disable()
+
+        return executor.submit(run)
+
+    def snapshot(self, label):
+        if self.use_tracemalloc:
+            self.snapshots.append((label, tracemalloc.take_snapshot()))
+
+    def _format(self):
+        wall = time.perf_counter() - self.start_time
+        out = io.StringIO()
+        out.write(f"Wall time: {wall:.3f}s\n\n")
+        out.write(f"{'stage':<16}{'calls':>10}{'total s':>12}{'mean ms':>12}{'max ms':>12}{'% wall':>9}\n")
+        known = [name for _, names in STAGE_GROUPS for name in names]
+        for name in known + sorted(set(self.stages) - set(known)):
+            if name not in self.stages:
+                continue
+            count, total, longest = self.stages[name]
+            out.write(f"{name:<16}{count:>10}{total:>12.3f}{total / count * 1000:>12.2f}"
+                      f"{longest * 1000:>12.2f}{total / wall * 100 if wall else 0:>8.1f}%\n")
+        totals = [f"{label} total: {sum(self.stages[name][1] for name in names if name in self.stages):.3f}s"
+                  for label, names in STAGE_GROUPS]
+        out.write("\n" + ", ".join(totals[:2]) + "\n" + ", ".join(totals[2:]) + "\n")
+
+        if self.use_cprofile:
+            stats = None
+            for profile in self.thread_profiles:
+                if stats is None:
+                    stats = pstats.Stats(profile, stream=out)
+                else:
+                    stats.add(profile)
+            if stats is not None:
+                out.write(f"\n== cProfile (top {self.top_n} by cumulative time, all threads) ==\n")
+                stats.sort_stats("cumulative").print_stats(self.top_n)
+
+        if self.use_tracemalloc:
+            current, peak = tracemalloc.get_traced_memory()
+            out.write(f"\n== tracemalloc: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB ==\n")
+            for label, snapshot in self.snapshots + [("final", tracemalloc.take_snapshot())]:
+                out.write(f"\n-- top {self.top_n} allocation sites ({label}) --\n")
+                for stat in snapshot.statistics("lineno")[:self.top_n]:
+                    out.write(f"{stat}\n")
+        return out.getvalue()
+
+    def report(self):
+        """
+        Writes the per-stage breakdown (plus cProfile / tracemalloc sections) to the report file.
+        """
+        if not self.enabled:
+            return
+        if self.use_cprofile:
+            self.main_profile.disable()
+        text = self._format()
+        if self.use_tracemalloc:
+            tracemalloc.stop()
+        report_dir = os.path.dirname(self.report_file)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+        with open(self.report_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"[INFO] Profile report saved to {self.report_file}.")
+
+
+NULL_PROFILER = Profiler()
+
+
+def add_profile_args(parser):
+    """
+    Adds the --profile / --profile_cprofile / --profile_tracemalloc options shared by all scripts.
+    """
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Write a per-stage timing report to this file.")
+    parser.add_argument("--profile_cprofile", action="store_true",
+                        help="With --profile, also include cProfile statistics from all threads.")
+    parser.add_argument("--profile_tracemalloc", action="store_true",
+                        help="With --profile, also trace allocations (send SIGUSR1 for a mid-run snapshot).")
+
+
+def make_profiler(args):
+    return Profiler(args.profile, args.profile_cprofile, args.profile_tracemalloc)
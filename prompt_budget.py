@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from functools import lru_cache
+
+DEFAULT_MIN_TOKENS = 64
+# Chat-format overhead per message (role markers, separators) and for the assistant priming tokens.
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+TRIM_MARKER = "\n\n[... truncated to fit the context window ...]\n\n"
+
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class ApproxTokenCounter:
+    """
+    Fast tokenizer-free counter: one token per punctuation mark and roughly one per 4 characters of a word.
+    Errs on the high side so budgets computed with it stay safe.
+    """
+    name = "approx"
+
+    def count(self, text):
+        return sum(max(1, math.ceil(len(piece) / 4)) for piece in _APPROX_TOKEN_RE.findall(text or ""))
+
+    def count_messages(self, messages):
+        total = REPLY_PRIMING_TOKENS
+        for message in messages:
+            total += MESSAGE_OVERHEAD_TOKENS + self.count(message.get("content", ""))
+        return total
+
+
+class HFTokenCounter:
+    """
+    Exact counter backed by a Hugging Face tokenizer; uses the model's chat template when it has one.
+    """
+
+    def __init__(self, tokenizer, name):
+        self.tokenizer = tokenizer
+        self.name = name
+
+    def count(self, text):
+        return len(self.tokenizer.encode(text or "", add_special_tokens=False))
+
+    def count_messages(self, messages):
+        if getattr(self.tokenizer, "chat_template", None):
+            return len(self.tokenizer.apply_chat_template(messages, add_generation_prompt=True, tokenize=True))
+        total = REPLY_PRIMING_TOKENS
+        for message in messages:
+            total += MESSAGE_OVERHEAD_TOKENS + self.count(message.get("content", ""))
+        return total
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(tokenizer_path=None):
+    """
+    Returns a (cached) token counter for `tokenizer_path`, falling back to ApproxTokenCounter when no
+    tokenizer is given or transformers is not installed.
+    """
+    if tokenizer_path:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_path, trust_remote_code=True)
+            return HFTokenCounter(tokenizer, os.path.basename(os.path.normpath(tokenizer_path)))
+        except Exception as e:
+            print(f"[WARN] Could not load tokenizer '{tokenizer_path}' ({e}); using approximate token counts.")
+    return ApproxTokenCounter()
+
+
+def trim_middle(text, counter, drop_tokens):
+    """
+    Removes roughly `drop_tokens` tokens from the middle of `text`, keeping its beginning and its end
+    (where the final answer usually is).
+    """
+    text = text or ""
+    text_tokens = counter.count(text)
+    if text_tokens <= drop_tokens:
+        return TRIM_MARKER.strip()
+    chars_per_token = len(text) / max(1, text_tokens)
+    drop_chars = int((drop_tokens + counter.count(TRIM_MARKER)) * chars_per_token * 1.1) + 1
+    keep = max(0, len(text) - drop_chars)
+    head = keep // 2
+    return text[:head] + TRIM_MARKER + text[len(text) - (keep - head):]
+
+
+class TokenIndex:
+    """
+    Sidecar JSON index caching prompt token counts per record, keyed by idx and a hash of the prompt,
+    so re-runs over the same input do not re-tokenize.
+    """
+
+    def __init__(self, index_file, counter_name):
+        self.index_file = index_file
+        self.counter_name = counter_name
+        self.counts = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        if index_file and os.path.exists(index_file):
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("tokenizer") == counter_name:
+                    self.counts = data.get("counts", {})
+            except (OSError, ValueError):
+                print(f"[WARN] Ignoring unreadable token index {index_file}.")
+
+    @staticmethod
+    def make_key(key, messages):
+        digest = hashlib.sha1(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+        return f"{key}:{digest[:16]}"
+
+    def get(self, index_key):
+        with self.lock:
+            return self.counts.get(index_key)
+
+    def put(self, index_key, count):
+        with self.lock:
+            self.counts[index_key] = count
+            self.dirty = True
+
+    def save(self):
+        if not self.index_file or not self.dirty:
+            return
+        with self.lock:
+            tmp_file = self.index_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({"tokenizer": self.counter_name, "counts": self.counts}, f)
+            os.replace(tmp_file, self.index_file)
+            self.dirty = False
+
+
+class PromptBudget:
+    """
+    Per-request max_tokens planning against a fixed context window.
+
+    plan() returns the messages to send (possibly trimmed) and the max_tokens to request, or None when the
+    prompt cannot fit even `min_tokens` of output. Counters record what a fixed max_tokens would have done.
+    """
+
+    def __init__(self, context_window, max_tokens, tokenizer=None, index_file=None, min_tokens=DEFAULT_MIN_TOKENS):
+        self.context_window = context_window
+        self.max_tokens = max_tokens
+        self.min_tokens = min(min_tokens, max_tokens)
+        self.counter = get_token_counter(tokenizer)
+        self.index = TokenIndex(index_file, self.counter.name)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "would_fail": 0, "reduced": 0, "trimmed": 0, "skipped": 0}
+
+    def _count(self, key, messages):
+        index_key = TokenIndex.make_key(key, messages)
+        count = self.index.get(index_key)
+        if count is None:
+            count = self.counter.count_messages(messages)
+            self.index.put(index_key, count)
+        return count
+
+    def _bump(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def plan(self, key, messages, trim=None):
+        """
+        `trim`, if given, is called as trim(drop_tokens) and must return rebuilt messages with about that
+        many tokens removed; it is only used when the prompt leaves less than min_tokens for the output.
+        """
+        self._bump("requests")
+        available = self.context_window - self._count(key, messages)
+        if available < self.max_tokens:
+            # vLLM rejects requests whose prompt + max_tokens exceeds the model length.
+            self._bump("would_fail")
+
+        if available < self.min_tokens and trim is not None:
+            messages = trim(self.max_tokens - available)
+            available = self.context_window - self.counter.count_messages(messages)
+            if available >= self.min_tokens:
+                self._bump("trimmed")
+
+        if available < self.min_tokens:
+            self._bump("skipped")
+            print(f"[WARN] Prompt for record {key} does not fit in the context window; skipping it.")
+            return messages, None
+        if available < self.max_tokens:
+            self._bump("reduced")
+        return messages, min(self.max_tokens, available)
+
+    def report(self):
+        self.index.save()
+        stats = self.stats
+        print(f"[INFO] Token budget ({self.counter.name}, context {self.context_window}): "
+              f"{stats['would_fail']}/{stats['requests']} requests would have exceeded the context with "
+              f"max_tokens={self.max_tokens}; {stats['reduced']} got a reduced max_tokens, "
+              f"{stats['trimmed']} were trimmed, {stats['skipped']} were skipped.")
+
+
+def make_budget(input_file, context_window, max_tokens, tokenizer=None):
+    """
+    Returns a PromptBudget with a sidecar token index next to `input_file`, or None when budgeting is off.
+    """
+    if not context_window:
+        return None
+    return PromptBudget(context_window, max_tokens, tokenizer, index_file=input_file + ".tokens.json")
+
+
+def add_budget_args(parser):
+    """
+    Adds the --context_window / --tokenizer options shared by all generation and eval scripts.
+    """
+    parser.add_argument("--context_window", type=int, default=None,
+                        help="Model context length; enables per-request max_tokens budgeting when set.")
+    parser.add_argument("--tokenizer", type=str, default=None,
+                        help="Tokenizer path for exact token counts (defaults to --model_path, else approximate).")
@@ -0,0 +1,13 @@
+"""
+Unified command line for the puzzle QA pipeline:
+
+    python -m puzzle_qa_eval advice | answer | answer-with-advice | eval | aggregate | run ...
+
+The subcommands wrap the existing scripts (generate_puzzle_advice.py, generate_puzzle_answers.py,
+generate_puzzle_answers_with_advice.py, eval_puzzle_answers.py), which stay usable on their own.
+`run --config jobs.json` runs many jobs in one process. Heavy dependencies (openai, requests, the
+generation modules) are only imported by the subcommand that needs them.
+
+The package is not installed: like the scripts it wraps, it is run from the repository root (the
+wrapped scripts are top-level modules there), so `python -m puzzle_qa_eval` needs that directory as cwd.
+"""
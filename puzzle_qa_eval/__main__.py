@@ -0,0 +1,4 @@
+from puzzle_qa_eval.cli import main
+
+if __name__ == "__main__":
+    main()
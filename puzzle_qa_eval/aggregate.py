@@ -0,0 +1,56 @@
+from utils import read_jsonl
+
+
+def summarize(verdicts):
+    """
+    Counts verdicts (True / False / None). Accuracy is correct / total, as printed by eval_puzzle_jsonl.
+    """
+    total = correct = unparsed = 0
+    for is_correct in verdicts:
+        total += 1
+        if is_correct is None:
+            unparsed += 1
+        elif is_correct:
+            correct += 1
+    accuracy = (correct / total) * 100 if total else 0.0
+    return {"total": total, "correct": correct, "unparsed": unparsed, "accuracy": round(accuracy, 2)}
+
+
+def aggregate_files(eval_files):
+    """
+    One summary row per eval JSONL file.
+    """
+    rows = []
+    for path in eval_files:
+        row = {"source": path}
+        row.update(summarize(item.get("is_correct") for item in read_jsonl(path)))
+        rows.append(row)
+    return rows
+
+
+def aggregate_store(store_dir):
+    """
+    One summary row per (dataset, model, run, judge) in a result store, without loading any text.
+    """
+    from result_store import ResultStore, field_value
+
+    groups = {}
+    for item in ResultStore(store_dir).iter_verdicts():
+        key = (item["dataset"], item["model"], item["run"], item["judge"])
+        groups.setdefault(key, []).append(field_value(item, "is_correct"))
+    rows = []
+    for (dataset, model, run, judge), verdicts in sorted(groups.items()):
+        row = {"source": store_dir, "dataset": dataset, "model": model, "run": run, "judge": judge}
+        row.update(summarize(verdicts))
+        rows.append(row)
+    return rows
+
+
+def format_table(rows):
+    lines = [f"{'source':<60}{'total':>8}{'correct':>9}{'unparsed':>10}{'accuracy':>10}"]
+    for row in rows:
+        label = row["source"]
+        if "model" in row:
+            label = "/".join(part for part in [row["dataset"], row["model"], row["run"], row["judge"]] if part)
+        lines.append(f"{label:<60}{row['total']:>8}{row['correct']:>9}{row['unparsed']:>10}{row['accuracy']:>9.2f}%")
+    return "\n".join(lines)
@@ -0,0 +1,224 @@
+import sys
+import json
+import argparse
+import importlib
+
+# subcommand -> (module, function, default max_tokens)
+GENERATION_COMMANDS = {
+    "advice": ("generate_puzzle_advice", "gen_advice", 512),
+    "answer": ("generate_puzzle_answers", "gen_answers", 1024),
+    "answer-with-advice": ("generate_puzzle_answers_with_advice", "gen_answers_with_advice", 1024),
+    "eval": ("eval_puzzle_answers", "eval_puzzle_jsonl", 512),
+}
+STORE_COMMANDS = ["answer", "answer-with-advice", "eval"]
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',')] if value else []
+
+
+def build_parser():
+    from utils import add_shard_args, add_window_args
+    from prompt_budget import add_budget_args
+    from batch_io import add_batch_args
+    from profiling import add_profile_args
+    from result_store import add_store_args
+    from judge_cascade import add_cascade_args
+    from single_flight import add_dedupe_args
+
+    parser = argparse.ArgumentParser(prog="python -m puzzle_qa_eval",
+                                     description="Puzzle QA pipeline: advice, answers, evaluation and aggregation.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command, (_, _, default_max_tokens) in GENERATION_COMMANDS.items():
+        sub = subparsers.add_parser(command, help=f"Run the {command} stage.")
+        sub.add_argument("--input_file", "--path_to_jsonl_list", dest="input_file", type=str, required=True,
+                         help="Input JSONL file(s), comma-separated.")
+        sub.add_argument("--output_file", "--output_file_list", dest="output_file", type=str,
+                         required=command != "eval", help="Output JSONL file(s), comma-separated.")
+        if command == "answer-with-advice":
+            sub.add_argument("--advice_file", type=str, required=True, help="Advice JSONL file(s), comma-separated.")
+        sub.add_argument("--api_base", type=str, default=None, help="Base URL for the OpenAI API.")
+        sub.add_argument("--model_name", type=str, default=None, help="Name of the model to use.")
+        sub.add_argument("--max_tokens", type=int, default=default_max_tokens, help="Maximum number of tokens to generate.")
+        sub.add_argument("--temperature", type=float, default=0.7, help="Sampling temperature.")
+        sub.add_argument("--model_path", type=str, default=None, help="Launch a vLLM server for this model first.")
+        sub.add_argument("--port", type=int, default=8000, help="Port to host the model on.")
+        sub.add_argument("--gpu", type=int, default=1, help="Number of GPUs to use.")
+        sub.add_argument("--threads", type=int, default=10, help="Number of worker threads.")
+        add_shard_args(sub)
+        add_budget_args(sub)
+        add_batch_args(sub)
+        add_window_args(sub)
+        add_dedupe_args(sub)
+        add_profile_args(sub)
+        if command in STORE_COMMANDS:
+            add_store_args(sub)
+        if command == "eval":
+            add_cascade_args(sub)
+
+    sub = subparsers.add_parser("aggregate", help="Summarize accuracy from eval files and/or a result store.")
+    sub.add_argument("--input_file", type=str, default=None, help="Eval JSONL file(s), comma-separated.")
+    sub.add_argument("--store_dir", type=str, default=None, help="Result store directory.")
+    sub.add_argument("--output_file", type=str, default=None, help="Write the summary rows to this JSONL file.")
+
+    sub = subparsers.add_parser("run", help="Run many jobs from a JSON (or YAML) config file in one process.")
+    sub.add_argument("--config", type=str, required=True, help="Config file with 'defaults' and a list of 'jobs'.")
+    parser.subcommands = subparsers.choices
+    return parser
+
+
+class ServerManager:
+    """
+    Keeps at most one vLLM server alive across jobs, reusing it while consecutive jobs ask for the same model.
+    """
+
+    def __init__(self):
+        self.spec = None
+        self.process = None
+
+    def ensure(self, args):
+        if not args.model_path or args.batch_export or args.batch_import:
+            return
+        spec = (args.model_path, args.model_name, args.port, args.gpu)
+        if spec == self.spec:
+            return
+        self.stop()
+        from utils import start_vllm_server
+        self.process = start_vllm_server(args.model_path, args.model_name, args.port, args.gpu)
+        self.spec = spec
+
+    def stop(self):
+        if self.process is not None:
+            from utils import stop_vllm_server
+            stop_vllm_server(self.process)
+        self.process = None
+        self.spec = None
+
+
+def check_generation_args(parser, args):
+    """
+    Rejects option combinations the stage functions would only fail on later, with the subcommand's usage.
+    """
+    error = parser.subcommands[args.command].error
+    if not args.batch_import and not args.model_name:
+        error("--model_name is required (unless --batch_import is given).")
+    if not (args.batch_export or args.batch_import) and not args.api_base:
+        error("--api_base is required (unless --batch_export or --batch_import is given).")
+    if args.command == "eval" and args.store_dir and not args.store_model:
+        error("--store_model is required with --store_dir: the model that wrote the answers.")
+
+
+def run_generation(parser, args, servers):
+    from utils import run_options
+    from batch_io import split_batch_paths
+    from profiling import make_profiler
+
+    check_generation_args(parser, args)
+    module_name, function_name, _ = GENERATION_COMMANDS[args.command]
+    function = getattr(importlib.import_module(module_name), function_name)
+
+    input_files = _split(args.input_file)
+    output_files = _split(args.output_file) or [None] * len(input_files)
+    if len(output_files) != len(input_files):
+        raise ValueError(f"[ERROR] Got {len(input_files)} input files but {len(output_files)} output files.")
+    batch_exports = split_batch_paths(args.batch_export, len(input_files))
+    batch_imports = split_batch_paths(args.batch_import, len(input_files))
+    advice_files = _split(getattr(args, "advice_file", None))
+
+    servers.ensure(args)
+    profiler = make_profiler(args)
+    for i, input_file in enumerate(input_files):
+        kwargs = dict(api_base=args.api_base, model_name=args.model_name, max_tokens=args.max_tokens,
+                      temperature=args.temperature, threads=args.threads,
+                      batch_export=batch_exports[i], batch_import=batch_imports[i], **run_options(args, profiler))
+        if args.command == "eval":
+            kwargs.update(small_judge_api_base=args.small_judge_api_base,
+                          small_judge_model_name=args.small_judge_model_name,
+                          cascade_threshold=args.cascade_threshold)
+            function(input_file, output_file=output_files[i], **kwargs)
+        elif args.command == "answer-with-advice":
+            function(input_file, advice_files[i], output_files[i], **kwargs)
+        else:
+            function(input_file, output_files[i], **kwargs)
+    profiler.report()
+
+
+def run_aggregate(args):
+    from utils import write_jsonl
+    from puzzle_qa_eval.aggregate import aggregate_files, aggregate_store, format_table
+
+    rows = aggregate_files(_split(args.input_file))
+    if args.store_dir:
+        rows += aggregate_store(args.store_dir)
+    print(format_table(rows))
+    if args.output_file:
+        write_jsonl(args.output_file, rows)
+        print(f"[INFO] Aggregate results saved to {args.output_file}.")
+
+
+def load_config(config_file):
+    with open(config_file, 'r', encoding='utf-8') as f:
+        if config_file.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def job_argv(command, options):
+    """
+    Turns a job's options into subcommand argv, so config jobs get exactly the CLI's parsing and defaults.
+    """
+    argv = [command]
+    for key, value in options.items():
+        if value is None or value is False:
+            continue
+        flag = "--" + key
+        if value is True:
+            argv.append(flag)
+        elif isinstance(value, (list, tuple)):
+            argv += [flag, ",".join(str(part) for part in value)]
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+def run_config(parser, config_file, servers):
+    config = load_config(config_file)
+    defaults = config.get("defaults", {})
+    jobs = config.get("jobs", [])
+    for number, job in enumerate(jobs, 1):
+        job = dict(job)
+        command = job.pop("command")
+        if command not in parser.subcommands or command == "run":
+            raise ValueError(f"[ERROR] Job {number} in {config_file} has unknown command '{command}'.")
+        # Defaults only fill in options the subcommand has; options given on the job itself must all be valid.
+        known = parser.subcommands[command]._option_string_actions
+        options = {key: value for key, value in defaults.items() if "--" + key in known}
+        options.update(job)
+        args = parser.parse_args(job_argv(command, options))
+        print(f"[INFO] Job {number}/{len(jobs)}: {args.command}")
+        dispatch(parser, args, servers)
+
+
+def dispatch(parser, args, servers):
+    if args.command in GENERATION_COMMANDS:
+        run_generation(parser, args, servers)
+    elif args.command == "aggregate":
+        run_aggregate(args)
+    elif args.command == "run":
+        run_config(parser, args.config, servers)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    servers = ServerManager()
+    try:
+        dispatch(parser, args, servers)
+    finally:
+        servers.stop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
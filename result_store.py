@@ -0,0 +1,338 @@
+"""
+Normalized, reference-based storage for datasets, answers and verdicts.
+
+A store is a directory of append-only JSONL files:
+
+    content.jsonl   {"ref", "text"}                                    every distinct text, stored once
+    datasets.jsonl  {"dataset", "idx", "fields": {title, content, answer}}
+    answers.jsonl   {"dataset", "idx", "model", "run", "fields": {...}}
+    verdicts.jsonl  {"dataset", "idx", "model", "run", "judge", "fields": {...}}
+
+`fields` keeps every field of the original record, in the original order, as {"ref": <content ref>} for
+strings, {"value": ...} for anything else, or {"dataset": <name>} for copies of the record's own idx and
+dataset fields. Every record needs an `idx`. Records are keyed by (dataset hash, idx, model, run); `run` separates advice variants and
+samples of the same model. Later records for the same key supersede earlier ones. export_answers /
+export_eval rebuild the denormalized answer and eval JSONL records the scripts write. One ResultStore may
+be shared between threads (e.g. the students of advice_pipeline); its reads and appends are serialized.
+
+    python result_store.py import --kind answers --input_file answers.jsonl --model qwen2.5-7b --store_dir store
+    python result_store.py export --kind eval --dataset <hash> --model qwen2.5-7b --store_dir store --output_file eval.jsonl
+"""
+import os
+import json
+import hashlib
+import argparse
+import threading
+
+from utils import write_jsonl, read_jsonl
+
+DATASET_FIELDS = ["title", "content", "answer"]
+# Record fields that are copies of the record's idx / dataset fields, per record kind.
+ANSWER_DATASET_FIELDS = {"idx": "idx", "title": "title", "content": "content", "answer": "answer"}
+EVAL_DATASET_FIELDS = {"idx": "idx", "puzzle_title": "title", "puzzle_content": "content",
+                       "reference_solution": "answer"}
+FLUSH_EVERY = 1000
+
+
+def text_ref(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:24]
+
+
+def _idx_order(idx):
+    return (0, idx, "") if isinstance(idx, (int, float)) else (1, 0, str(idx))
+
+
+def record_idx(item):
+    """
+    Returns the `idx` of a record being stored; store rows are keyed by it, so records without one are rejected.
+    """
+    if "idx" not in item:
+        raise ValueError("[ERROR] The result store needs an 'idx' field on every record.")
+    return item["idx"]
+
+
+def field_value(row, name, default=None):
+    """
+    Returns a non-text field (e.g. is_correct) of an answer or verdict row without resolving any text.
+    """
+    return row["fields"].get(name, {}).get("value", default)
+
+
+def dataset_hash(records):
+    """
+    Order-independent hash of the dataset fields (idx, title, content, answer) of `records`,
+    so the same dataset gets the same key whether it is read from the dataset, an answer file or in any order.
+    """
+    total = 0
+    for item in records:
+        canonical = json.dumps([item.get("idx")] + [item.get(field) for field in DATASET_FIELDS], ensure_ascii=False)
+        total = (total + int(hashlib.sha1(canonical.encode('utf-8')).hexdigest(), 16)) % (1 << 160)
+    return f"{total:040x}"[:16]
+
+
+class ResultStore:
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.paths = {name: os.path.join(store_dir, f"{name}.jsonl")
+                      for name in ["content", "datasets", "answers", "verdicts"]}
+        self._refs = None
+        self._texts = None
+        self._rows = {}
+        self._dataset_files = {}
+        self.lock = threading.RLock()
+
+    def _read(self, name):
+        """
+        Rows of one store file, parsed once per ResultStore and cached until the next append to it.
+        """
+        with self.lock:
+            if name not in self._rows:
+                path = self.paths[name]
+                self._rows[name] = list(read_jsonl(path)) if os.path.exists(path) else []
+            return self._rows[name]
+
+    def _known_refs(self):
+        if self._refs is None:
+            path = self.paths["content"]
+            self._refs = {item["ref"] for item in read_jsonl(path)} if os.path.exists(path) else set()
+        return self._refs
+
+    def _ref(self, text, pending_texts):
+        """
+        Returns the content ref of `text`, queueing it for content.jsonl if it is not stored yet.
+        """
+        ref = text_ref(text)
+        known = self._known_refs()
+        if ref not in known:
+            known.add(ref)
+            pending_texts.append({"ref": ref, "text": text})
+        return ref
+
+    def _encode_value(self, value, pending_texts):
+        if isinstance(value, str):
+            return {"ref": self._ref(value, pending_texts)}
+        return {"value": value}
+
+    def _encode(self, item, dataset_fields, pending_texts):
+        """
+        Encodes every field of `item`, in order: copies of dataset fields as references to the dataset,
+        strings as content refs and everything else as plain values.
+        """
+        fields = {}
+        for name, value in item.items():
+            if name in dataset_fields:
+                fields[name] = {"dataset": dataset_fields[name]}
+            else:
+                fields[name] = self._encode_value(value, pending_texts)
+        return fields
+
+    def _decode(self, row, dataset_row, texts):
+        record = {}
+        for name, spec in row["fields"].items():
+            if "dataset" in spec:
+                if spec["dataset"] == "idx":
+                    record[name] = row["idx"]
+                    continue
+                spec = dataset_row["fields"][spec["dataset"]]
+            record[name] = texts[spec["ref"]] if "ref" in spec else spec["value"]
+        return record
+
+    def _append(self, name, items):
+        if items:
+            write_jsonl(self.paths[name], items, append=True)
+            self._rows.pop(name, None)
+            if name == "content":
+                self._texts = None
+
+    def add_dataset(self, records):
+        """
+        Stores the dataset fields of `records` and returns the dataset hash.
+        """
+        records = list(records)
+        with self.lock:
+            return self._register_dataset(dataset_hash(records), records)
+
+    def add_dataset_file(self, path):
+        """
+        Same as add_dataset for a JSONL file, read in two streaming passes (hash, then register) so memory
+        does not grow with the file. Each file is registered once per ResultStore.
+        """
+        with self.lock:
+            if path not in self._dataset_files:
+                self._dataset_files[path] = self._register_dataset(dataset_hash(read_jsonl(path)), read_jsonl(path))
+            return self._dataset_files[path]
+
+    def _register_dataset(self, key, records):
+        path = self.paths["datasets"]
+        existing = {item["idx"] for item in read_jsonl(path) if item["dataset"] == key} if os.path.exists(path) else set()
+        texts, rows = [], []
+        for item in records:
+            idx = record_idx(item)
+            if idx in existing:
+                continue
+            existing.add(idx)
+            fields = {field: self._encode_value(item.get(field, ""), texts) for field in DATASET_FIELDS}
+            rows.append({"dataset": key, "idx": idx, "fields": fields})
+            if len(rows) >= FLUSH_EVERY:
+                self._append("content", texts)
+                self._append("datasets", rows)
+                texts, rows = [], []
+        self._append("content", texts)
+        self._append("datasets", rows)
+        return key
+
+    def _tee(self, name, records, make_row):
+        """
+        Yields `records` unchanged while appending make_row(item, texts) rows to `name`, flushing
+        every FLUSH_EVERY rows so streaming runs keep their memory bound.
+        """
+        texts, rows = [], []
+        for item in records:
+            with self.lock:
+                rows.append(make_row(item, texts))
+                if len(rows) >= FLUSH_EVERY:
+                    self._append("content", texts)
+                    self._append(name, rows)
+                    texts, rows = [], []
+            yield item
+        with self.lock:
+            self._append("content", texts)
+            self._append(name, rows)
+
+    def tee_answers(self, key, model, records, run=""):
+        """
+        Stores answer records (gen_answers output) as they pass through; dataset fields are stored as
+        references to the dataset registered under `key`.
+        """
+        def make_row(item, texts):
+            return {"dataset": key, "idx": record_idx(item), "model": model, "run": run,
+                    "fields": self._encode(item, ANSWER_DATASET_FIELDS, texts)}
+        return self._tee("answers", records, make_row)
+
+    def tee_verdicts(self, key, model, judge, records, run=""):
+        """
+        Stores eval records (eval_puzzle_jsonl output) as they pass through; copies of dataset fields are
+        stored as references to the dataset registered under `key`.
+        """
+        def make_row(item, texts):
+            return {"dataset": key, "idx": record_idx(item), "model": model, "run": run, "judge": judge,
+                    "fields": self._encode(item, EVAL_DATASET_FIELDS, texts)}
+        return self._tee("verdicts", records, make_row)
+
+    def add_answers(self, key, model, records, run=""):
+        return sum(1 for _ in self.tee_answers(key, model, records, run))
+
+    def add_verdicts(self, key, model, judge, records, run=""):
+        return sum(1 for _ in self.tee_verdicts(key, model, judge, records, run))
+
+    def texts(self):
+        with self.lock:
+            if self._texts is None:
+                path = self.paths["content"]
+                self._texts = {item["ref"]: item["text"] for item in read_jsonl(path)} if os.path.exists(path) else {}
+            return self._texts
+
+    def _latest(self, name, match):
+        latest = {}
+        for item in self._read(name):
+            if match(item):
+                latest[item["idx"]] = item
+        return latest
+
+    def _dataset_rows(self, key):
+        return self._latest("datasets", lambda item: item["dataset"] == key)
+
+    def iter_verdicts(self, key=None, model=None, run=None, judge=None):
+        """
+        Yields the latest verdict rows (refs unresolved) for aggregation without loading any text.
+        """
+        def match(item):
+            return ((key is None or item["dataset"] == key) and (model is None or item["model"] == model)
+                    and (run is None or item["run"] == run) and (judge is None or item["judge"] == judge))
+        latest = {}
+        for item in self._read("verdicts"):
+            if match(item):
+                latest[(item["dataset"], item["idx"], item["model"], item["run"], item["judge"])] = item
+        return iter(latest.values())
+
+    def export_answers(self, key, model, run=""):
+        """
+        Denormalized answer records, as written by gen_answers, in dataset idx order.
+        """
+        texts = self.texts()
+        dataset_rows = self._dataset_rows(key)
+        answers = self._latest("answers", lambda item: item["dataset"] == key and item["model"] == model
+                               and item["run"] == run)
+        for idx in sorted(answers, key=_idx_order):
+            yield self._decode(answers[idx], dataset_rows.get(idx), texts)
+
+    def export_eval(self, key, model, run="", judge=None):
+        """
+        Denormalized eval records, as written by eval_puzzle_jsonl, in dataset idx order.
+        """
+        texts = self.texts()
+        dataset_rows = self._dataset_rows(key)
+        verdicts = self._latest("verdicts", lambda item: item["dataset"] == key and item["model"] == model
+                                and item["run"] == run and (judge is None or item["judge"] == judge))
+        for idx in sorted(verdicts, key=_idx_order):
+            yield self._decode(verdicts[idx], dataset_rows.get(idx), texts)
+
+    def keys(self):
+        """
+        Returns the distinct (kind, dataset, model, run) combinations in the store.
+        """
+        found = set()
+        for name in ["answers", "verdicts"]:
+            for item in self._read(name):
+                found.add((name, item["dataset"], item["model"], item["run"]))
+        return sorted(found)
+
+
+def add_store_args(parser):
+    """
+    Adds the --store_dir / --store_model / --store_run options for writing results into a ResultStore.
+    """
+    parser.add_argument("--store_dir", type=str, default=None,
+                        help="Also write results into this normalized result store (see result_store.py).")
+    parser.add_argument("--store_model", type=str, default=None,
+                        help="Model label for store records: the answering model (default: --model_name for answers; required for eval).")
+    parser.add_argument("--store_run", type=str, default="",
+                        help="Run label for store records, e.g. an advice variant or sample id.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import into / export from a normalized result store.")
+    parser.add_argument("command", choices=["import", "export", "list"])
+    parser.add_argument("--store_dir", type=str, required=True, help="Result store directory.")
+    parser.add_argument("--kind", type=str, choices=["answers", "eval"], default="answers", help="Record kind.")
+    parser.add_argument("--input_file", type=str, default=None, help="Denormalized JSONL file to import.")
+    parser.add_argument("--output_file", type=str, default=None, help="Denormalized JSONL file to export to.")
+    parser.add_argument("--dataset", type=str, default=None, help="Dataset hash to export.")
+    parser.add_argument("--model", type=str, default=None, help="Model label.")
+    parser.add_argument("--run", type=str, default="", help="Run label.")
+    parser.add_argument("--judge", type=str, default="", help="Judge model label (eval records).")
+
+    args = parser.parse_args()
+    store = ResultStore(args.store_dir)
+
+    if args.command == "list":
+        for kind, key, model, run in store.keys():
+            print(f"{kind}\t{key}\t{model}\t{run}")
+    elif args.command == "import":
+        records = list(read_jsonl(args.input_file))
+        if args.kind == "answers":
+            key = store.add_dataset(records)
+            count = store.add_answers(key, args.model, records, args.run)
+        else:
+            key = store.add_dataset([{"idx": record_idx(item), "title": item.get("puzzle_title", ""),
+                                      "content": item.get("puzzle_content", ""),
+                                      "answer": item.get("reference_solution", "")} for item in records])
+            count = store.add_verdicts(key, args.model, args.judge, records, args.run)
+        print(f"[INFO] Imported {count} {args.kind} records for dataset {key} into {args.store_dir}.")
+    else:
+        if args.kind == "answers":
+            records = store.export_answers(args.dataset, args.model, args.run)
+        else:
+            records = store.export_eval(args.dataset, args.model, args.run, args.judge or None)
+        write_jsonl(args.output_file, records)
+        print(f"[INFO] Exported {args.kind} records to {args.output_file}.")
@@ -0,0 +1,127 @@
+"""
+Single-flight coalescing and cross-run deduplication of identical chat requests.
+
+Requests are identical when the completion function, model, messages and sampling parameters all match
+(the API base is not part of the key, so a resumed run on another port still matches). While one such
+request is in flight, later ones wait for it and share its result instead of going to the server. With a
+cache file, finished results are also kept and appended to it, so identical requests later in the run or
+in later runs are answered from the file.
+
+Sharing a result is only valid when it does not matter which sample is returned: the layer is enabled at
+temperature 0, or explicitly with --dedupe.
+"""
+import json
+import os
+import hashlib
+import threading
+from concurrent.futures import Future
+
+from utils import read_jsonl, write_jsonl
+
+FLUSH_EVERY = 100
+
+
+def request_key(fn, kwargs):
+    """
+    Stable key for fn(**kwargs), ignoring api_base.
+    """
+    params = {name: value for name, value in kwargs.items() if name != "api_base"}
+    canonical = json.dumps([fn.__name__, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    Wraps completion calls: call(fn, **kwargs) returns fn(**kwargs), sharing one server call between
+    identical concurrent requests and, with `cache_file`, across runs. Thread-safe.
+    A disabled SingleFlight calls fn directly.
+    """
+
+    def __init__(self, enabled=False, cache_file=None):
+        self.enabled = enabled
+        self.cache_file = cache_file if enabled else None
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.cache = {}
+        self.pending_writes = []
+        self.counts = {"requests": 0, "sent": 0, "coalesced": 0, "cached": 0}
+        if self.cache_file and os.path.exists(self.cache_file):
+            for item in read_jsonl(self.cache_file):
+                self.cache[item["key"]] = item["response"]
+
+    def call(self, fn, **kwargs):
+        if not self.enabled:
+            return fn(**kwargs)
+        key = request_key(fn, kwargs)
+        with self.lock:
+            self.counts["requests"] += 1
+            if key in self.cache:
+                self.counts["cached"] += 1
+                return self.cache[key]
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+                self.counts["sent"] += 1
+            else:
+                self.counts["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(**kwargs)
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.in_flight[key]
+            if self.cache_file and result is not None:
+                self.cache[key] = result
+                self.pending_writes.append({"key": key, "response": result})
+                if len(self.pending_writes) >= FLUSH_EVERY:
+                    self._flush()
+        future.set_result(result)
+        return result
+
+    def _flush(self):
+        if self.pending_writes:
+            write_jsonl(self.cache_file, self.pending_writes, append=True)
+            self.pending_writes = []
+
+    def report(self):
+        """
+        Writes outstanding cache entries and prints how many requests were coalesced or served from the cache.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.cache_file:
+                self._flush()
+            counts = dict(self.counts)
+        if not counts["requests"]:
+            return
+        print(f"[INFO] Dedupe: {counts['requests']} requests, {counts['sent']} sent to the server, "
+              f"{counts['coalesced']} coalesced with an identical in-flight request, "
+              f"{counts['cached']} answered from {self.cache_file or 'the cache'}.")
+
+
+def make_single_flight(temperature, dedupe=False, cache_file=None):
+    """
+    Returns a SingleFlight, enabled at temperature 0 or when `dedupe` is set.
+    """
+    enabled = dedupe or temperature == 0
+    if cache_file and not enabled:
+        print(f"[WARN] Ignoring --dedupe_cache {cache_file}: sampling at temperature {temperature} without --dedupe.")
+    return SingleFlight(enabled, cache_file)
+
+
+def add_dedupe_args(parser):
+    """
+    Adds the --dedupe / --dedupe_cache options shared by all generation and eval scripts.
+    """
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Share one server call between identical requests even when sampling (temperature > 0).")
+    parser.add_argument("--dedupe_cache", type=str, default=None,
+                        help="JSONL cache of finished requests, reused across runs (needs temperature 0 or --dedupe).")
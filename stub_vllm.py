@@ -0,0 +1,209 @@
+"""
+Stand-in for the vLLM entry points, for exercising the scripts without a GPU.
+
+    python stub_vllm.py run_batch -i requests.jsonl -o results.jsonl
+    python stub_vllm.py serve --port 8010 --latency 0.05 --judge_spread 0.3
+
+`run_batch` mirrors `python -m vllm.entrypoints.openai.run_batch` and writes a Batch-format results file
+with canned completions. `serve` mirrors the OpenAI-compatible API server (/v1/models and
+/v1/chat/completions, with logprobs when asked for) and answers each request after `--latency` seconds.
+
+Judge prompts get a verdict derived from a hash of the prompt, so every stub judge agrees on it. With
+`--judge_spread` > 0 the stub acts as a weaker judge: its confidence in the verdict is drawn from
+[1 - spread, 1] and it flips the verdict with probability 1 - confidence, so the logprobs it reports
+are calibrated.
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import write_jsonl, read_jsonl
+
+STUB_TOP_LOGPROBS = 5
+
+
+def _uniform(text, salt):
+    """
+    Deterministic value in [0, 1) for `text`.
+    """
+    digest = hashlib.md5(f"{salt}:{text}".encode('utf-8')).hexdigest()
+    return int(digest[:12], 16) / float(1 << 48)
+
+
+def stub_verdict(user, spread=0.0):
+    """
+    Returns (verdict, confidence) for a judge prompt; see the module docstring.
+    """
+    verdict = _uniform(user, "verdict") < 0.5
+    confidence = 1.0 - spread * _uniform(user, "confidence")
+    if _uniform(user, "flip") < 1.0 - confidence:
+        verdict = not verdict
+    return verdict, confidence
+
+
+def stub_reply(body, response_text=None, spread=0.0):
+    """
+    Canned completion for a chat request body: (text, verdict confidence or None).
+    A verdict for judge prompts, an echo otherwise.
+    """
+    if response_text is not None:
+        return response_text, None
+    messages = body.get("messages", [])
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+    if "puzzle evaluator" in system:
+        verdict, confidence = stub_verdict(user, spread)
+        return f"Evaluation: {verdict}. Explanation: stub verdict.", confidence
+    return ("Stub response to: " + user.splitlines()[0] if user else "Stub response."), None
+
+
+def stub_logprobs(content, confidence, top_logprobs):
+    """
+    OpenAI-style logprobs for `content`, split into word-ish tokens. Every token is certain except the
+    judge verdict, which gets `confidence` against the opposite verdict.
+    """
+    entries = []
+    verdict_seen = False
+    for token in re.findall(r"\s*\w+|\s*[^\w\s]", content):
+        word = token.strip()
+        if confidence is not None and not verdict_seen and word in ("True", "False"):
+            verdict_seen = True
+            other = token.replace(word, "False" if word == "True" else "True")
+            alternatives = [(token, math.log(confidence)),
+                            (other, math.log(max(1.0 - confidence, 1e-12)))]
+        else:
+            alternatives = [(token, 0.0)]
+        entries.append({
+            "token": token,
+            "logprob": alternatives[0][1],
+            "bytes": list(token.encode('utf-8')),
+            "top_logprobs": [{"token": alt, "logprob": logprob, "bytes": list(alt.encode('utf-8'))}
+                             for alt, logprob in alternatives[:top_logprobs]]
+        })
+    return {"content": entries}
+
+
+def stub_completion(body, response_text=None, spread=0.0):
+    """
+    Builds an OpenAI chat.completion object for `body`.
+    """
+    content, confidence = stub_reply(body, response_text, spread)
+    logprobs = None
+    if body.get("logprobs"):
+        logprobs = stub_logprobs(content, confidence, body.get("top_logprobs") or STUB_TOP_LOGPROBS)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "logprobs": logprobs,
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content.split()), "total_tokens": len(content.split())}
+    }
+
+
+def run_batch(input_file, output_file, response_text=None):
+    """
+    Reads Batch-format requests and writes one Batch-format result per request.
+    """
+    results = []
+    for request in read_jsonl(input_file):
+        results.append({
+            "id": f"batch-{uuid.uuid4().hex}",
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "request_id": f"req-{uuid.uuid4().hex}",
+                "body": stub_completion(request["body"], response_text)
+            },
+            "error": None
+        })
+    write_jsonl(output_file, results)
+    print(f"[INFO] Stub batch run wrote {len(results)} results to {output_file}.")
+
+
+def serve(port, model_name="stub", latency=0.0, response_text=None, spread=0.0):
+    """
+    Serves /v1/models and /v1/chat/completions on `port` until interrupted.
+    GET /stats returns the number of chat requests served so far.
+    """
+    lock = threading.Lock()
+    stats = {"requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, payload, status=200):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == "/v1/models":
+                self._send({"object": "list", "data": [{"id": model_name, "object": "model", "owned_by": "stub"}]})
+            elif self.path.rstrip('/') == "/stats":
+                with lock:
+                    payload = dict(stats)
+                self._send(payload)
+            else:
+                self._send({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != "/v1/chat/completions":
+                self._send({"error": "not found"}, 404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with lock:
+                stats["requests"] += 1
+            if latency:
+                time.sleep(latency)
+            self._send(stub_completion(body, response_text, spread))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    print(f"[INFO] Stub server for '{model_name}' listening on port {port} (latency {latency}s).", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in for vLLM entry points (no GPU needed).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("run_batch", help="Mimic vllm.entrypoints.openai.run_batch.")
+    batch_parser.add_argument("-i", "--input_file", type=str, required=True, help="Batch-format request JSONL.")
+    batch_parser.add_argument("-o", "--output_file", type=str, required=True, help="Batch-format results JSONL.")
+    batch_parser.add_argument("--response", type=str, default=None, help="Fixed completion text for every request.")
+
+    serve_parser = subparsers.add_parser("serve", help="Mimic vllm.entrypoints.openai.api_server.")
+    serve_parser.add_argument("--port", type=int, default=8000, help="Port to listen on.")
+    serve_parser.add_argument("--model_name", type=str, default="stub", help="Served model name.")
+    serve_parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each reply.")
+    serve_parser.add_argument("--response", type=str, default=None, help="Fixed completion text for every request.")
+    serve_parser.add_argument("--judge_spread", type=float, default=0.0,
+                              help="Judge confidence is drawn from [1 - spread, 1]; 0 is a perfect, certain judge.")
+
+    args = parser.parse_args()
+
+    if args.command == "run_batch":
+        run_batch(args.input_file, args.output_file, args.response)
+    elif args.command == "serve":
+        serve(args.port, args.model_name, args.latency, args.response, args.judge_spread)
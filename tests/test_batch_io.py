@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import write_jsonl, read_jsonl
+from stub_vllm import run_batch
+from generate_puzzle_answers import gen_answers
+
+
+def test_batch_export_run_import_round_trip(tmp_path):
+    records = [{"idx": i, "title": f"Puzzle {i}", "content": "How many coins?", "answer": str(i)} for i in range(6)]
+    # Far over the context window: the token budget skips it, so it gets no request.
+    records[2]["content"] = "coins " * 2000
+    input_file = str(tmp_path / "puzzles.jsonl")
+    write_jsonl(input_file, records)
+    batch_file, results_file = str(tmp_path / "batch.jsonl"), str(tmp_path / "results.jsonl")
+    options = dict(max_tokens=128, context_window=1024)
+
+    gen_answers(input_file, None, None, "stub", batch_export=batch_file, **options)
+    requests = list(read_jsonl(batch_file))
+    assert [request["custom_id"] for request in requests] == [f"answer-{i}" for i in [0, 1, 3, 4, 5]]
+
+    run_batch(batch_file, results_file, response_text="Answer: 42")
+    results = list(read_jsonl(results_file))
+    # Results are joined by custom_id, not by position, and a failed request gets no answer.
+    results.reverse()
+    results[0]["response"]["status_code"] = 500
+    failed_id = results[0]["custom_id"]
+    write_jsonl(results_file, results)
+
+    output_file = str(tmp_path / "answers.jsonl")
+    gen_answers(input_file, output_file, None, "stub", batch_import=results_file, **options)
+    answers = list(read_jsonl(output_file))
+    assert [item["idx"] for item in answers] == list(range(6))
+    for item in answers:
+        expected = None if item["idx"] == 2 or f"answer-{item['idx']}" == failed_id else "Answer: 42"
+        assert item["llm_answer"] == expected
+        assert {name: item[name] for name in records[item["idx"]]} == records[item["idx"]]
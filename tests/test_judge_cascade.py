@@ -0,0 +1,104 @@
+import os
+import sys
+import math
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import write_jsonl
+from stub_vllm import stub_completion
+from eval_puzzle_answers import build_eval_messages
+from judge_cascade import JudgeCascade, verdict_confidence, calibration_report
+
+
+def as_tokens(completion):
+    """
+    Token logprobs of a stub completion in the format of utils.chat_completion_logprobs.
+    """
+    logprobs = completion["choices"][0]["logprobs"]
+    if logprobs is None:
+        return None
+    return [{"token": entry["token"], "logprob": entry["logprob"],
+             "top_logprobs": {alt["token"]: alt["logprob"] for alt in entry["top_logprobs"]}}
+            for entry in logprobs["content"]]
+
+
+class StubSingleFlight:
+    """
+    Answers chat_completion_logprobs calls from stub_vllm.
+    """
+
+    def __init__(self, spread):
+        self.spread = spread
+
+    def call(self, fn, **kwargs):
+        completion = stub_completion({"messages": kwargs["messages"], "logprobs": True}, spread=self.spread)
+        return completion["choices"][0]["message"]["content"], as_tokens(completion)
+
+
+def judge_messages(number):
+    return build_eval_messages(f"Puzzle {number}", "How many coins?", str(number), "42")
+
+
+def test_verdict_confidence_from_stub_logprobs():
+    messages = judge_messages(0)
+    completion = stub_completion({"messages": messages, "logprobs": True}, spread=0.5)
+    verdict, confidence = verdict_confidence(completion["choices"][0]["message"]["content"], as_tokens(completion))
+    stub_verdict = "True" in completion["choices"][0]["message"]["content"]
+    assert verdict == stub_verdict
+    assert 0.5 <= confidence <= 1.0
+
+
+def test_verdict_split_across_tokens():
+    response = "Evaluation: True. Explanation: ok."
+    tokens = [{"token": "Evaluation", "logprob": 0.0, "top_logprobs": {}},
+              {"token": ":", "logprob": 0.0, "top_logprobs": {}},
+              {"token": " Tr", "logprob": math.log(0.6), "top_logprobs": {" Tr": math.log(0.6), " Fal": math.log(0.2)}},
+              {"token": "ue", "logprob": 0.0, "top_logprobs": {}}]
+    verdict, confidence = verdict_confidence(response, tokens)
+    assert verdict is True
+    assert confidence == pytest.approx(0.75)
+
+
+def test_verdict_without_logprobs():
+    assert verdict_confidence("Evaluation: False. Explanation: no.", None) == (False, None)
+    assert verdict_confidence("No verdict here.", None) == (None, None)
+
+
+def test_cascade_escalates_below_threshold():
+    messages = judge_messages(1)
+    single_flight = StubSingleFlight(spread=0.5)
+    _, confidence = verdict_confidence(*single_flight.call(None, messages=messages))
+    escalated = []
+
+    def escalate():
+        escalated.append(True)
+        return "Evaluation: True. Explanation: large judge."
+
+    cascade = JudgeCascade("http://stub", "small", threshold=confidence - 0.01, single_flight=single_flight)
+    response, fields = cascade.judge(messages, 64, 0.0, escalate)
+    assert fields["judge_tier"] == "small" and not escalated
+    assert fields["judge_confidence"] == pytest.approx(confidence)
+
+    cascade = JudgeCascade("http://stub", "small", threshold=confidence + 0.01, single_flight=single_flight)
+    response, fields = cascade.judge(messages, 64, 0.0, escalate)
+    assert fields["judge_tier"] == "large" and escalated
+    assert response == "Evaluation: True. Explanation: large judge."
+    assert cascade.counts == {"small": 0, "large": 1, "no_confidence": 0}
+
+
+def test_calibration_report_bins(tmp_path):
+    confidences = [0.55, 0.97, 0.99, 1.0, None]
+    cascade = [{"idx": i, "is_correct": True, "small_is_correct": True, "judge_confidence": confidence,
+                "judge_tier": "small" if confidence and confidence >= 0.9 else "large"}
+               for i, confidence in enumerate(confidences)]
+    reference = [{"idx": i, "is_correct": i != 1} for i in range(len(confidences))]
+    cascade_file, reference_file = str(tmp_path / "cascade.jsonl"), str(tmp_path / "large.jsonl")
+    write_jsonl(cascade_file, cascade)
+    write_jsonl(reference_file, reference)
+
+    lines = calibration_report(cascade_file, reference_file).splitlines()
+    bins = [line.rsplit(None, 2) for line in lines if line.startswith(("[", "unmeasured"))]
+    assert bins == [["[0.50, 0.60)", "1", "100.00"], ["[0.95, 0.99)", "1", "0.00"], ["[0.99, 1.00]", "2", "100.00"],
+                    ["unmeasured", "1", "100.00"]]
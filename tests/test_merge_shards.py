@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import write_jsonl, read_jsonl, select_shard
+from merge_shards import merge_shards
+
+
+def make_records(count):
+    return [{"idx": i, "title": f"Puzzle {i}", "content": "x" * (i * 7 % 13), "answer": str(i)} for i in range(count)]
+
+
+@pytest.mark.parametrize("balance", ["hash", "length"])
+def test_shard_merge_round_trip(tmp_path, balance):
+    records = make_records(10)
+    reference = str(tmp_path / "input.jsonl")
+    write_jsonl(reference, records)
+
+    shard_files = []
+    for shard_index in range(3):
+        shard_file = str(tmp_path / f"shard{shard_index}.jsonl")
+        shard = select_shard(read_jsonl(reference), shard_index, 3, balance)
+        # Shard outputs are the shard inputs plus the generated fields.
+        write_jsonl(shard_file, [dict(item, llm_answer=f"answer {item['idx']}") for item in shard])
+        shard_files.append(shard_file)
+
+    merged_file = str(tmp_path / "merged.jsonl")
+    merge_shards(shard_files, reference, merged_file)
+    assert list(read_jsonl(merged_file)) == [dict(item, llm_answer=f"answer {item['idx']}") for item in records]
+
+
+def test_shard_merge_rejects_missing_record(tmp_path):
+    reference = str(tmp_path / "input.jsonl")
+    write_jsonl(reference, make_records(4))
+    shard_file = str(tmp_path / "shard0.jsonl")
+    write_jsonl(shard_file, make_records(3))
+
+    with pytest.raises(RuntimeError):
+        merge_shards([shard_file], reference, str(tmp_path / "merged.jsonl"))
+
+
+def test_sharding_requires_idx():
+    records = [{"title": f"Puzzle {i}"} for i in range(10)]
+    with pytest.raises(ValueError):
+        select_shard(records, 0, 2)
+    # A single shard is the unsharded run and keeps working without idx.
+    assert select_shard(records, 0, 1) == records
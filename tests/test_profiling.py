@@ -0,0 +1,25 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import Profiler
+
+
+def busy_work(n):
+    return sum(i * i for i in range(n))
+
+
+def test_cprofile_covers_worker_threads(tmp_path):
+    report_file = str(tmp_path / "profile.txt")
+    profiler = Profiler(report_file, use_cprofile=True)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [profiler.submit(executor, busy_work, 10000) for _ in range(8)]
+    assert [future.result() for future in futures] == [busy_work(10000)] * 8
+    profiler.report()
+
+    with open(report_file, encoding="utf-8") as f:
+        report = f.read()
+    assert "queue_wait" in report
+    assert "busy_work" in report
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import write_jsonl, read_jsonl
+from result_store import ResultStore
+
+
+def test_store_export_is_byte_identical(tmp_path):
+    answers = [{"idx": i, "title": f"Puzzle {i}", "content": "x" * i, "answer": str(i),
+                "llm_answer": f"answer {i}" if i % 3 else None} for i in range(8)]
+    # Cascade eval records put the judge fields before is_correct.
+    verdicts = [{"idx": item["idx"], "puzzle_title": item["title"], "puzzle_content": item["content"],
+                 "llm_solution": item["llm_answer"] or "", "reference_solution": item["answer"],
+                 "judge_tier": "small", "judge_confidence": 0.97, "is_correct": item["idx"] % 2 == 0,
+                 "judge_output": "Correct"} for item in answers]
+    answer_file, eval_file = str(tmp_path / "answers.jsonl"), str(tmp_path / "eval.jsonl")
+    write_jsonl(answer_file, answers)
+    write_jsonl(eval_file, verdicts)
+
+    store = ResultStore(str(tmp_path / "store"))
+    key = store.add_dataset_file(answer_file)
+    assert store.add_dataset_file(answer_file) == key
+    store.add_answers(key, "model", answers)
+    store.add_verdicts(key, "model", "judge", verdicts)
+    assert sum(1 for _ in read_jsonl(store.paths["datasets"])) == len(answers)
+
+    store = ResultStore(str(tmp_path / "store"))
+    write_jsonl(str(tmp_path / "answers_out.jsonl"), store.export_answers(key, "model"))
+    write_jsonl(str(tmp_path / "eval_out.jsonl"), store.export_eval(key, "model"))
+    for original, exported in [("answers.jsonl", "answers_out.jsonl"), ("eval.jsonl", "eval_out.jsonl")]:
+        with open(tmp_path / original, 'rb') as f, open(tmp_path / exported, 'rb') as g:
+            assert f.read() == g.read()
+
+
+def test_store_rejects_records_without_idx(tmp_path):
+    store = ResultStore(str(tmp_path / "store"))
+    with pytest.raises(ValueError):
+        store.add_dataset([{"title": f"Puzzle {i}", "content": "x", "answer": str(i)} for i in range(5)])
+
+
+def test_store_keeps_non_text_dataset_fields(tmp_path):
+    answers = [{"idx": 0, "title": None, "content": "x", "answer": 42, "llm_answer": "42"}]
+    store = ResultStore(str(tmp_path / "store"))
+    key = store.add_dataset(answers)
+    store.add_answers(key, "model", answers)
+    assert list(ResultStore(str(tmp_path / "store")).export_answers(key, "model")) == answers
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from single_flight import SingleFlight, make_single_flight
+
+
+class SlowServer:
+    """
+    Stands in for a completion function: counts calls and answers after a short delay.
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def chat(self, model_name, messages, temperature=0.0):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.2)
+        if self.error is not None:
+            raise self.error
+        return f"{model_name}: {messages}"
+
+
+def call_concurrently(single_flight, fn, kwargs_list):
+    barrier = threading.Barrier(len(kwargs_list))
+
+    def call(kwargs):
+        barrier.wait()
+        return single_flight.call(fn, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=len(kwargs_list)) as executor:
+        futures = [executor.submit(call, kwargs) for kwargs in kwargs_list]
+    return futures
+
+
+def test_identical_concurrent_calls_are_coalesced():
+    server = SlowServer()
+    single_flight = SingleFlight(enabled=True)
+    kwargs_list = [{"model_name": "m", "messages": f"puzzle {i % 3}"} for i in range(48)]
+    futures = call_concurrently(single_flight, server.chat, kwargs_list)
+
+    assert [future.result() for future in futures] == [f"m: {kwargs['messages']}" for kwargs in kwargs_list]
+    assert server.calls == 3
+    assert single_flight.counts == {"requests": 48, "sent": 3, "coalesced": 45, "cached": 0}
+
+
+def test_waiting_calls_share_the_exception():
+    server = SlowServer(error=RuntimeError("server down"))
+    single_flight = SingleFlight(enabled=True)
+    futures = call_concurrently(single_flight, server.chat, [{"model_name": "m", "messages": "x"}] * 8)
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="server down"):
+            future.result()
+    assert server.calls == 1
+    # A failed request is not remembered: the next identical call is sent again.
+    server.error = None
+    assert single_flight.call(server.chat, model_name="m", messages="x") == "m: x"
+    assert server.calls == 2
+
+
+def test_cache_round_trip(tmp_path):
+    cache_file = str(tmp_path / "dedupe.jsonl")
+
+    def chat_with_logprobs(api_base, model_name, messages):
+        return "Evaluation: True", [{"token": "True", "logprob": -0.1}]
+
+    single_flight = make_single_flight(0, cache_file=cache_file)
+    first = single_flight.call(chat_with_logprobs, api_base="http://a", model_name="m", messages="x")
+    single_flight.report()
+
+    def unreachable(api_base, model_name, messages):
+        raise AssertionError("answered from the cache")
+    unreachable.__name__ = chat_with_logprobs.__name__
+
+    # A later run on another port is answered from the file. Tuples come back as lists, which unpack the same.
+    single_flight = make_single_flight(0, cache_file=cache_file)
+    content, tokens = single_flight.call(unreachable, api_base="http://b", model_name="m", messages="x")
+    assert (content, tokens) == first
+    assert single_flight.counts["cached"] == 1
+
+
+def test_disabled_calls_go_through():
+    server = SlowServer()
+    single_flight = make_single_flight(0.7)
+    futures = call_concurrently(single_flight, server.chat, [{"model_name": "m", "messages": "x"}] * 4)
+    assert [future.result() for future in futures] == ["m: x"] * 4
+    assert server.calls == 4
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import write_jsonl, read_jsonl
+
+
+def failing_stream(count):
+    for i in range(count):
+        yield {"idx": i}
+    raise RuntimeError("API error")
+
+
+def test_streamed_write_keeps_partial_output(tmp_path):
+    output_file = str(tmp_path / "out.jsonl")
+    with pytest.raises(RuntimeError):
+        write_jsonl(output_file, failing_stream(5), atomic=False)
+    assert list(read_jsonl(output_file)) == [{"idx": i} for i in range(5)]
+
+
+def test_list_write_is_atomic(tmp_path):
+    output_file = str(tmp_path / "out.jsonl")
+    write_jsonl(output_file, [{"idx": 0}])
+
+    class BadRecord:
+        pass
+
+    with pytest.raises(TypeError):
+        write_jsonl(output_file, [{"idx": 1}, {"idx": BadRecord()}])
+    assert list(read_jsonl(output_file)) == [{"idx": 0}]
+    assert os.listdir(tmp_path) == ["out.jsonl"]
+
+
+def test_read_keeps_non_finite_numbers(tmp_path):
+    input_file = tmp_path / "eval.jsonl"
+    input_file.write_text('{"idx": 1, "judge_confidence": NaN}\n{"idx": 2, "judge_confidence": Infinity}\n'
+                          'not json\n', encoding='utf-8')
+    records = list(read_jsonl(str(input_file)))
+    assert [item["idx"] for item in records] == [1, 2]
+    assert records[0]["judge_confidence"] != records[0]["judge_confidence"]
+    # Only the invalid line is removed from the file.
+    assert [item["idx"] for item in read_jsonl(str(input_file))] == [1, 2]
+
+
+def test_atomic_write_of_a_stream_keeps_old_output(tmp_path):
+    output_file = str(tmp_path / "out.jsonl")
+    write_jsonl(output_file, [{"idx": 0}])
+    with pytest.raises(RuntimeError):
+        write_jsonl(output_file, failing_stream(5))
+    assert list(read_jsonl(output_file)) == [{"idx": 0}]
@@ -2,69 +2,443 @@
 import os
 import time
 import json
-import requests
 from typing import Dict, Any, List
-import subprocess
-from openai import OpenAI
-import json
-import os
-import codecs
+import io
+import gzip
+import hashlib
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# Faster JSON backend when installed; PUZZLE_QA_JSON=json forces the standard library.
+try:
+    if os.environ.get("PUZZLE_QA_JSON", "orjson") != "orjson":
+        raise ImportError
+    import orjson
+
+    def json_loads(line):
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:  # e.g. NaN / Infinity, which the standard library reads and writes
+            return json.loads(line)
+
+    def json_dumps(item):
+        try:
+            return orjson.dumps(item, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:  # e.g. integers beyond 64 bits
+            return json.dumps(item, ensure_ascii=False)
+except ImportError:
+    orjson = None
+
+    def json_loads(line):
+        return json.loads(line)
+
+    def json_dumps(item):
+        return json.dumps(item, ensure_ascii=False)
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def open_jsonl(file_path, mode='r'):
+    """
+    Opens a JSONL file in text mode ('r', 'w' or 'a'), compressed transparently by extension:
+    .gz with gzip, .zst with zstandard (optional dependency).
+    """
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, mode + 't', encoding='utf-8', compresslevel=6)
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"Reading or writing {file_path} requires the 'zstandard' package.")
+        if mode == 'r':
+            raw = open(file_path, 'rb')
+            # Appended files hold several frames.
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        else:
+            raw = open(file_path, mode + 'b')
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(file_path, mode, encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
 
 
 def filter_and_fix_file(file_path):
     """
     Reads a JSONL file, removes invalid lines, and overwrites the original file with only valid lines.
+    Lines are streamed through a temporary file, and the file is left untouched when nothing was removed.
     """
-    valid_lines = []
+    tmp_path = _temp_path(file_path)
+    removed = 0
     
-    with open(file_path, 'r', encoding='utf-8') as infile:
+    with open_jsonl(file_path, 'r') as infile, open_jsonl(tmp_path, 'w') as outfile:
         for line in infile:
             if line.strip():  # Check if the line is not empty
                 try:
-                    json.loads(line)  # Attempt to load the line as JSON
-                    valid_lines.append(line)  # Store valid lines
+                    json_loads(line)  # Attempt to load the line as JSON
+                    outfile.write(line)  # Keep valid lines
+                    continue
                 except json.JSONDecodeError:
                     print(f"Invalid JSON line removed: {line.strip()}")  # Log invalid line
+            removed += 1
     
     # Overwrite the original file with valid lines
-    with open(file_path, 'w', encoding='utf-8') as outfile:
-        outfile.writelines(valid_lines)
+    if removed:
+        os.replace(tmp_path, file_path)
+    else:
+        os.remove(tmp_path)
 
 def read_jsonl(file_path):
     """
-    Reads a JSONL file, ensuring proper UTF-8 handling and fixing any Unicode escape sequences.
-    Yields each JSON object as a dictionary.
+    Reads a JSONL file (optionally .gz / .zst compressed), ensuring proper UTF-8 handling.
+    Yields each JSON object as a dictionary. Invalid lines are skipped and, once the file has been read
+    to the end, removed from it with filter_and_fix_file.
     """
-    filter_and_fix_file(file_path)  # Ensure invalid lines are removed
-    with codecs.open(file_path, 'r', encoding='utf-8') as f:
+    invalid = False
+    with open_jsonl(file_path, 'r') as f:
         for line in f:
             line = line.strip()
             if line:
                 try:
-                    data = json.loads(line)  # Load JSON and decode Unicode properly
-                    yield data
+                    data = json_loads(line)  # Load JSON and decode Unicode properly
                 except json.JSONDecodeError as e:
                     print(f"[ERROR] Skipping invalid JSON line in {file_path}: {line} - {e}")
+                    invalid = True
+                    continue
+                yield data
+    if invalid:
+        filter_and_fix_file(file_path)  # Ensure invalid lines are removed
+
+
+def _temp_path(file_path):
+    # Keep the extension so the temporary file gets the same compression.
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{os.getpid()}.tmp.{name}")
 
 
-def write_jsonl(file_path, data_list, append=False):
+def write_jsonl(file_path, data_list, append=False, atomic=True):
     """
-    Writes a list of dictionaries to a JSONL file with proper UTF-8 encoding.
-    Ensures Unicode characters are stored correctly without escaping.
+    Writes an iterable of dictionaries to a JSONL file with proper UTF-8 encoding (compressed by extension,
+    see open_jsonl). Unicode characters are stored without escaping.
+    With `atomic` the records go to a temporary file that replaces `file_path` only once complete. Streamed
+    writes (run_parallel with a window) pass atomic=False and write in place, so records written before a
+    failure are kept. Appends always write in place.
     """
-    mode = 'a' if append else 'w'
-
     # Ensure the directory exists before writing
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    atomic = atomic and not append
+    target = _temp_path(file_path) if atomic else file_path
+    try:
+        with open_jsonl(target, 'a' if append else 'w') as f:
+            chunk, chunk_size = [], 0
+            try:
+                for item in data_list:
+                    json_line = json_dumps(item)
+                    chunk.append(json_line)
+                    chunk_size += len(json_line)
+                    if chunk_size >= WRITE_BUFFER_SIZE:
+                        f.write('\n'.join(chunk) + '\n')
+                        chunk, chunk_size = [], 0
+            finally:
+                # Also flushes the buffered records of a streamed write that fails part way.
+                if chunk and not atomic:
+                    f.write('\n'.join(chunk) + '\n')
+            if chunk and atomic:
+                f.write('\n'.join(chunk) + '\n')
+    except BaseException:
+        if atomic and os.path.exists(target):
+            os.remove(target)
+        elif not append:
+            print(f"[WARN] Write to {file_path} interrupted; the records written so far are kept.")
+        raise
+    if atomic:
+        os.replace(target, file_path)
+
+
+def record_key(data_item, position):
+    """
+    Returns the key identifying a record inside its dataset: the dataset `idx` when present,
+    otherwise the record's position in the file.
+    """
+    return data_item.get("idx", position)
+
+
+def record_length(data_item):
+    """
+    Cheap prompt-length proxy for a record: total number of characters across its string fields.
+    """
+    return sum(len(value) for value in data_item.values() if isinstance(value, str))
+
+
+def shard_of(key, num_shards):
+    """
+    Maps a record key to a shard with a stable hash, so every machine computes the same partition.
+    """
+    digest = hashlib.md5(str(key).encode('utf-8')).hexdigest()
+    return int(digest, 16) % num_shards
+
+
+def shard_key(data_item):
+    """
+    Returns the `idx` of a record being sharded. Sharded outputs are merged back by idx (merge_shards.py),
+    and a position inside one shard cannot be mapped back to the input, so records without idx are rejected.
+    """
+    if "idx" not in data_item:
+        raise ValueError("[ERROR] Sharding (--num_shards > 1) needs an 'idx' field on every input record.")
+    return data_item["idx"]
+
+
+def select_shard(data_list, shard_index=0, num_shards=1, balance="hash", lazy=False):
+    """
+    Returns the records of `data_list` that belong to shard `shard_index` out of `num_shards`,
+    keeping their original order.
+
+    balance="hash" assigns each record by a stable hash of its idx.
+    balance="length" assigns records longest-first to the currently lightest shard (by prompt length),
+    which keeps shard makespans even when puzzle lengths vary a lot. Both are deterministic.
+    With lazy=True the hash partition is returned as a generator over `data_list` instead of a list;
+    the length partition always needs the whole input.
+    With num_shards > 1 every record must have an idx (see shard_key).
+    """
+    if num_shards < 1:
+        raise ValueError(f"num_shards must be >= 1, got {num_shards}")
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+
+    if balance == "hash" or num_shards == 1:
+        selected = (item for item in data_list
+                    if num_shards == 1 or shard_of(shard_key(item), num_shards) == shard_index)
+        return selected if lazy else list(selected)
+    if balance != "length":
+        raise ValueError(f"Unknown shard balance mode: {balance}")
+
+    data_list = list(data_list)
+    keys = [shard_key(item) for item in data_list]
+
+    costs = [record_length(item) for item in data_list]
+    order = sorted(range(len(data_list)), key=lambda pos: (-costs[pos], str(keys[pos])))
+    loads = [0] * num_shards
+    assigned = [0] * len(data_list)
+    for pos in order:
+        target = min(range(num_shards), key=lambda shard: (loads[shard], shard))
+        loads[target] += costs[pos]
+        assigned[pos] = target
+    return [item for pos, item in enumerate(data_list) if assigned[pos] == shard_index]
+
+
+def run_parallel(process_fn, items, threads=10, window=None, profiler=None, ordered=True):
+    """
+    Yields process_fn(item) for every item, in input order, using a pool of `threads` workers.
+
+    Without a window every item is submitted up front. With `window` set, items are pulled lazily and at
+    most `window` of them are submitted but not yet yielded, so memory stays bounded by the window rather
+    than the dataset size. Results are still yielded in input order; a window a few times larger than
+    `threads` keeps the workers busy behind a slow item.
+    With ordered=False results are yielded in completion order instead, as soon as each one is done.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        def submit(item):
+            if profiler is not None:
+                return profiler.submit(executor, process_fn, item)
+            return executor.submit(process_fn, item)
+
+        if not ordered:
+            pending = set()
+            for item in items:
+                if window and len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(submit(item))
+                done, pending = wait(pending, timeout=0)
+                for future in done:
+                    yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            return
+
+        pending = deque()
+        for item in items:
+            if window and len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(submit(item))
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_records(task, input_file, output_file, build_messages, finish, *, api_base=None, model_name=None,
+                max_tokens=1024, temperature=0.7, threads=10, complete_fn=None, request=None, trim=None,
+                records=None, ordered=True, sinks=None, results_hook=None, extra_body=None, postprocess=None,
+                shard_index=0, num_shards=1, shard_balance="hash", context_window=None, tokenizer=None,
+                batch_export=None, batch_import=None, profiler=None, window=None,
+                store_dir=None, store_model=None, store_run="", store_judge=None,
+                single_flight=None, dedupe=False, dedupe_cache=None):
+    """
+    Shared run loop of the generation and eval scripts: reads and shards `input_file`, builds one request per
+    record, sends them (or exports / imports them in batch mode), and writes `finish(record, response)` for
+    every record to `output_file` (skipped when None). Returns False in batch-export mode, True otherwise.
+
+    `build_messages(record)` returns the chat messages, or None for a record that gets no request.
+    `complete_fn` (e.g. chat_completion) is called through single-flight; `request(messages, max_tokens)`
+    replaces it and returns (response, extra_fields), the fields being merged into the output record.
+    `trim(record, drop_tokens, counter)` rebuilds the messages of an over-long prompt for the token budget.
+    `records` replaces reading `input_file` (still used for the token index and the store dataset).
+    `sinks` get each output record as soon as it is written; `results_hook` wraps the output records.
+    `extra_body` / `postprocess` are passed to the batch export / import (see batch_io).
+
+    Options shared by all scripts:
+    shard_index / num_shards / shard_balance: process one shard of the input (see select_shard).
+    context_window / tokenizer: budget max_tokens per request (see prompt_budget.PromptBudget).
+    batch_export / batch_import: two-phase offline batch mode (see batch_io).
+    profiler: times the read / prompt / queue / network / parse / write stages (see profiling).
+    window: stream records and write results as they complete (see run_parallel).
+    store_dir (or a ResultStore) / store_model / store_run: also write the output records to a normalized
+    result store (see result_store), as verdicts judged by `store_judge` when that is set.
+    single_flight, or dedupe / dedupe_cache: share one server call between identical requests (see single_flight).
+    """
+    from prompt_budget import make_budget
+    from profiling import NULL_PROFILER
+    from result_store import ResultStore
+    from batch_io import export_batch_requests, import_batch_results
+    from single_flight import make_single_flight
+
+    profiler = profiler or NULL_PROFILER
+    if records is None:
+        with profiler.stage("read_input"):
+            records = select_shard(read_jsonl(input_file), shard_index, num_shards, shard_balance, lazy=bool(window))
+    budget = make_budget(input_file, context_window, max_tokens, tokenizer)
+    single_flight = single_flight or make_single_flight(temperature, dedupe, dedupe_cache)
+    if request is None:
+        def request(messages, item_max_tokens):
+            return single_flight.call(complete_fn, api_base=api_base, model_name=model_name, messages=messages,
+                                      max_tokens=item_max_tokens, temperature=temperature), None
+
+    # Register the dataset before any request is sent, so a bad input fails before the run, not after it.
+    store = dataset_key = None
+    if store_dir and not batch_export:
+        if store_judge is not None and not store_model:
+            raise ValueError("[ERROR] Storing verdicts (--store_dir) needs --store_model, the model that wrote the answers.")
+        store = store_dir if isinstance(store_dir, ResultStore) else ResultStore(store_dir)
+        dataset_key = store.add_dataset_file(input_file)
+
+    def prepare(data_item):
+        messages = build_messages(data_item)
+        if messages is None:
+            return None, None
+        if budget is None:
+            return messages, max_tokens
+        item_trim = (lambda drop_tokens: trim(data_item, drop_tokens, budget.counter)) if trim else None
+        return budget.plan(data_item.get("idx", data_item.get("title", "")), messages, item_trim)
+
+    def process_data(data_item):
+        with profiler.stage("build_prompt"):
+            messages, item_max_tokens = prepare(data_item)
+        response = extra_fields = None
+        if item_max_tokens is not None:
+            with profiler.stage("network"):
+                response, extra_fields = request(messages, item_max_tokens)
+        with profiler.stage("parse_response"):
+            output_item = finish(data_item, response)
+            if extra_fields:
+                output_item.update(extra_fields)
+            return output_item
+
+    def forward(output_items):
+        for output_item in output_items:
+            for sink in sinks:
+                sink(output_item)
+            yield output_item
+
+    if batch_export:
+        export_batch_requests(batch_export, task, records, prepare, model_name, temperature, extra_body)
+    else:
+        if batch_import:
+            with profiler.stage("parse_response"):
+                output_items = import_batch_results(batch_import, task, records, finish, postprocess)
+        else:
+            output_items = run_parallel(process_data, records, threads, window, profiler, ordered=ordered)
+            if sinks:
+                output_items = forward(output_items)
+            if not window:
+                output_items = list(output_items)
+        if results_hook is not None:
+            output_items = results_hook(output_items)
+        if store is not None and store_judge is not None:
+            output_items = store.tee_verdicts(dataset_key, store_model, store_judge, output_items, store_run)
+        elif store is not None:
+            output_items = store.tee_answers(dataset_key, store_model or model_name, output_items, store_run)
+
+        # In streaming mode the write interleaves with dispatch, so it is timed as one stage.
+        with profiler.stage("stream_output" if window else "write_output"):
+            if output_file:
+                write_jsonl(output_file, output_items, atomic=not window)
+            else:
+                for _ in output_items:
+                    pass
+        if store is not None:
+            print(f"[INFO] Results stored in {store.store_dir} (dataset {dataset_key}).")
+    if budget is not None:
+        budget.report()
+    single_flight.report()
+    return not batch_export
+
+
+def run_options(args, profiler=None):
+    """
+    Returns the run_records options shared by every input file of a script invocation, from parsed arguments
+    (batch paths are per file and passed separately).
+    """
+    options = dict(shard_index=args.shard_index, num_shards=args.num_shards, shard_balance=args.shard_balance,
+                   context_window=args.context_window, tokenizer=args.tokenizer or args.model_path,
+                   window=args.window, dedupe=args.dedupe, dedupe_cache=args.dedupe_cache, profiler=profiler)
+    for name in ["store_dir", "store_model", "store_run"]:
+        if hasattr(args, name):
+            options[name] = getattr(args, name)
+    return options
+
+
+def launch_server(args):
+    """
+    Starts a vLLM server for `args.model_path` and returns its process, or None when there is nothing to
+    launch: no model path, or batch mode, which never talks to a live server.
+    """
+    if not args.model_path or args.batch_export or args.batch_import:
+        return None
+    return start_vllm_server(args.model_path, args.model_name, args.port, args.gpu)
+
+
+def add_window_args(parser):
+    """
+    Adds the --window option shared by all generation and eval scripts.
+    """
+    parser.add_argument("--window", type=int, default=None,
+                        help="Stream records and keep at most this many requests in flight (bounded memory).")
+
+
+def add_shard_args(parser):
+    """
+    Adds the --shard_index / --num_shards / --shard_balance options shared by all generation and eval scripts.
+    """
+    parser.add_argument("--shard_index", type=int, default=0, help="Index of the shard to process (0-based).")
+    parser.add_argument("--num_shards", type=int, default=1, help="Total number of shards the dataset is split into.")
+    parser.add_argument("--shard_balance", type=str, default="hash", choices=["hash", "length"],
+                        help="Partition by a stable hash of idx, or balance shards by prompt length.")
+
+
+@lru_cache(maxsize=None)
+def openai_client(api_base: str):
+    """
+    Returns a shared OpenAI client for `api_base` (thread-safe, keeps connections alive across requests).
+    openai is imported here rather than at module load so that importing utils stays cheap.
+    """
+    from openai import OpenAI
+    return OpenAI(base_url=api_base, api_key="xxx")
 
-    with codecs.open(file_path, mode, encoding='utf-8') as f:
-        for item in data_list:
-            # Decode any escaped Unicode characters before writing
-            json_line = json.dumps(item, ensure_ascii=False)
-            json_line = json_line.encode('utf-8').decode('utf-8')  # Ensures proper encoding
-            
-            f.write(json_line + '\n')
-            
 
 def chat_completion(api_base: str, model_name: str, messages: list, max_tokens=256, temperature=0.7):
     """
@@ -74,7 +448,7 @@ def chat_completion(api_base: str, model_name: str, messages: list, max_tokens=2
     if '/v1' not in api_base:
         api_base = api_base + '/v1'
     
-    client = OpenAI(base_url=api_base, api_key="xxx")  # point to the local vLLM server
+    client = openai_client(api_base)  # point to the local vLLM server
     completion = client.chat.completions.create(
         model=model_name,
         messages=messages,
@@ -84,6 +458,68 @@ def chat_completion(api_base: str, model_name: str, messages: list, max_tokens=2
     return completion.choices[0].message.content
 
 
+def chat_completion_logprobs(api_base: str, model_name: str, messages: list, max_tokens=256, temperature=0.7,
+                             top_logprobs=5):
+    """
+    Same as chat_completion, but also asks for token logprobs.
+    Returns (content, tokens) where tokens is a list of {"token", "logprob", "top_logprobs": {token: logprob}},
+    or None when the server sent no logprobs.
+    """
+
+    if '/v1' not in api_base:
+        api_base = api_base + '/v1'
+
+    client = openai_client(api_base)  # point to the local vLLM server
+    completion = client.chat.completions.create(
+        model=model_name,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        logprobs=True,
+        top_logprobs=top_logprobs
+    )
+    choice = completion.choices[0]
+    if choice.logprobs is None or not choice.logprobs.content:
+        return choice.message.content, None
+    tokens = [{"token": entry.token, "logprob": entry.logprob,
+               "top_logprobs": {alt.token: alt.logprob for alt in entry.top_logprobs or []}}
+              for entry in choice.logprobs.content]
+    return choice.message.content, tokens
+
+
+# Qwen3 chat templates think by default; the advice stage wants the final answer only.
+QWEN3_EXTRA_BODY = {"chat_template_kwargs": {"enable_thinking": False}}
+
+
+def chat_completion_qwen3(api_base: str, model_name: str, messages: list, max_tokens=256, temperature=0.7):
+    """
+    Same as chat_completion, but for Qwen3 models: disables thinking mode and strips any <think> block
+    that still comes back.
+    """
+    
+    if '/v1' not in api_base:
+        api_base = api_base + '/v1'
+    
+    client = openai_client(api_base)  # point to the local vLLM server
+    completion = client.chat.completions.create(
+        model=model_name,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        extra_body=QWEN3_EXTRA_BODY
+    )
+    return strip_think(completion.choices[0].message.content)
+
+
+def strip_think(content):
+    """
+    Removes a leading <think>...</think> block from a model response.
+    """
+    if content and '</think>' in content:
+        content = content.split('</think>', 1)[1].lstrip()
+    return content
+
+
 
 def start_vllm_server(model_path: str, model_name: str, port: int, gpu: int = 1):
     """
@@ -103,6 +539,7 @@ def start_vllm_server(model_path: str, model_name: str, port: int, gpu: int = 1)
         '--trust-remote-code'
     ]
 
+    import subprocess
     process = subprocess.Popen(command, shell=False)
     
     wait_for_server(f"http://localhost:{port}", 600)
@@ -138,6 +575,7 @@ def start_vllm_server_with_gpus(model_path: str, model_name: str, port: int, gpu
         '--trust-remote-code'
     ]
 
+    import subprocess
     process = subprocess.Popen(command, shell=False, env=os.environ.copy())
     
     wait_for_server(f"http://localhost:{port}", 600)
@@ -179,6 +617,7 @@ def wait_for_server(url: str, timeout: int = 600):
     """
     Polls the server's /models endpoint until it responds with HTTP 200 or times out.
     """
+    import requests
     start_time = time.time()
     while True:
         try: